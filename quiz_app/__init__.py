@@ -0,0 +1 @@
+default_app_config = "quiz_app.apps.QuizAppConfig"
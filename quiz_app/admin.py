@@ -1,18 +1,20 @@
+import csv
 import json
-from collections import Counter
+import tempfile
+import time
 
 from django.contrib import admin, messages
 from django.contrib.admin import SimpleListFilter
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import models
-from django.db.models import Sum
 from django.forms import Textarea
-from django.forms.models import model_to_dict
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import redirect, render
 from django.template.response import TemplateResponse
-from django.urls import path
+from django.urls import path, reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from import_export import resources
@@ -20,8 +22,24 @@ from import_export.admin import ImportExportModelAdmin
 from import_export.fields import Field
 from import_export.formats import base_formats
 
+from . import entry, jobs, reports, roster
+from .memory import PeakRSS
+from .excel import generate_quiz_results_as_excel
 from .forms import SignUpForm
-from .models import Account, Question, Question_bank, Quiz, QuizTakers, Response
+from .models import (
+    Account,
+    Job,
+    OutgoingMail,
+    Question,
+    Question_bank,
+    QuestionBankImport,
+    Quiz,
+    QuizExport,
+    QuizTakers,
+    Response,
+)
+from .question_bank import copy_to_quiz, generate_from_blueprint
+from .signals import quiz_content_changed
 
 
 class AccountAdmin(UserAdmin):
@@ -52,6 +70,57 @@ class AccountAdmin(UserAdmin):
         choices.reverse()
         return choices
 
+    def get_urls(self):
+        urls = super(AccountAdmin, self).get_urls()
+        my_urls = [
+            path(
+                "assign_roster/",
+                self.admin_site.admin_view(self.assign_roster),
+                name="account_assign_roster",
+            ),
+        ]
+        return my_urls + urls
+
+    def assign_roster(self, request):
+        """Assign the students of an uploaded or pasted list of emails to a quiz"""
+
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        quizzes = Quiz.objects.order_by("-created_at").values_list("pk", "title")
+        quiz_id = request.POST.get("quiz") or request.GET.get("quizid", "")
+        result = None
+        if request.method == "POST":
+            try:
+                quiz = Quiz.objects.filter(pk=quiz_id).first()
+            except ValidationError:
+                quiz = None
+            text = request.POST.get("emails", "")
+            upload = request.FILES.get("file")
+            if upload:
+                text += "\n" + upload.read().decode("utf-8", errors="replace")
+            emails = roster.parse_emails(text)
+            if not quiz:
+                messages.error(request, "Please Select A Quiz")
+            elif not emails:
+                messages.error(request, "No Emails Found")
+            else:
+                result = roster.assign_emails(quiz, emails)
+                messages.success(
+                    request,
+                    f"{result['assigned']} Students Assigned To {quiz.title}",
+                )
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Assign Roster To Quiz",
+            quizzes=quizzes,
+            quiz_id=str(quiz_id),
+            result=result,
+        )
+        return TemplateResponse(request, "admin/account_assign_roster.html", context)
+
     def assign_users(self, request, queryset):
         """Assign the selected users to the given quiz"""
 
@@ -63,9 +132,7 @@ class AccountAdmin(UserAdmin):
             return redirect(request.get_full_path())
 
         try:
-            quiz = Quiz.objects.prefetch_related(
-                "quiztakers_set", "quiztakers_set__user"
-            ).get(pk=quiz_id)
+            quiz = Quiz.objects.filter(pk=quiz_id).first()
         except ValidationError:
             messages.error(request, mark_safe("Invalid Quiz Id Found"))
             return redirect(request.get_full_path())
@@ -77,16 +144,30 @@ class AccountAdmin(UserAdmin):
         if "apply" in request.POST:
             if request.POST.get("apply", "") == "Cancel":
                 return redirect(request.get_full_path())
-            quizTakers = []
-            for user in queryset:
-                quizTaker = QuizTakers(quiz=quiz, user=user)
-                quizTakers.append(quizTaker)
-            QuizTakers.objects.bulk_create(quizTakers, ignore_conflicts=True)
+            result = roster.assign_queryset(quiz, queryset)
+            messages.success(
+                request,
+                f"{result['assigned']} Students Assigned To {quiz.title}, "
+                f"{result['already_assigned']} Already Assigned",
+            )
             return redirect(request.get_full_path())
 
+        # only the counts are shown, the selection can be every account
+        select_across = request.POST.get("select_across") == "1"
+        selected_count = queryset.count()
+        already_count = QuizTakers.objects.filter(
+            quiz=quiz, user__in=queryset.order_by().values("pk")
+        ).count()
         context = {
             "quiz": quiz,
-            "users": queryset,
+            "current_count": quiz.quiztakers_set.count(),
+            "selected_count": selected_count,
+            "already_count": already_count,
+            "new_count": selected_count - already_count,
+            "select_across": select_across,
+            # posted back even with select_across, the changelist only runs
+            # the action of a confirmation posting some selected ids
+            "selected": request.POST.getlist("_selected_action"),
         }
         return render(request, "admin/user_confirmation.html", context=context)
 
@@ -118,6 +199,7 @@ class AccountAdmin(UserAdmin):
     actions = ["assign_users"]
     filter_horizontal = ()
     list_filter = (EmptyQuizIDFilter,)
+    change_list_template = "admin/account_list.html"
     fieldsets = (
         (None, {"fields": ("email", "password"),}),
         (_("Personal info"), {"fields": ("full_name", "timeZone")}),
@@ -183,28 +265,118 @@ class QuizAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.quiz_report),
                 name="quiz_report",
             ),
+            path(
+                "<quiz_id>/export/",
+                self.admin_site.admin_view(self.quiz_export),
+                name="quiz_export",
+            ),
+            path(
+                "<quiz_id>/entry_links/",
+                self.admin_site.admin_view(self.quiz_entry_links),
+                name="quiz_entry_links",
+            ),
+            path(
+                "<quiz_id>/generate/",
+                self.admin_site.admin_view(self.quiz_generate),
+                name="quiz_generate",
+            ),
         ]
         return my_urls + urls
 
-    def quiz_report(self, request, quiz_id):
+    def quiz_entry_links(self, request, quiz_id):
+        """Download the one-time entry links of all the quiz takers as a csv"""
 
         quiz = Quiz.objects.get(quiz_id=quiz_id)
-        totalMarks = quiz.question_set.aggregate(Sum("marks"))["marks__sum"]
-        marks = (
-            QuizTakers.objects.filter(quiz=quiz)
-            .prefetch_related("response_set__marks")
-            .values_list("id")
-            .annotate(marks_obtained=Sum("response__marks"))
+        if not self.has_change_permission(request, quiz):
+            raise PermissionDenied
+
+        response = HttpResponse(content_type="text/csv")
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="Entry Links {quiz.title}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(["Name", "Email", "Link"])
+        for quizTaker, token in entry.issue_tokens(quiz):
+            link = request.build_absolute_uri(reverse("quiz_entry", args=[token]))
+            writer.writerow([quizTaker.user.full_name, quizTaker.user.email, link])
+        return response
+
+    def quiz_generate(self, request, quiz_id):
+        """Add random questions from the question bank as per a blueprint"""
+
+        quiz = Quiz.objects.get(quiz_id=quiz_id)
+        if not self.has_change_permission(request, quiz):
+            raise PermissionDenied
+
+        blueprint = request.POST.get("blueprint", "")
+        if request.method == "POST":
+            try:
+                added = generate_from_blueprint(quiz, blueprint)
+            except ValueError as e:
+                messages.error(request, f"Invalid Blueprint: {e}")
+            else:
+                # the copy does not send the post_save signal
+                quiz_content_changed(quiz.pk)
+                messages.success(request, f"{added} Questions Added To {quiz.title}")
+                return redirect("admin:quiz_app_quiz_change", quiz.pk)
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title="Generate Questions",
+            quiz=quiz,
+            blueprint=blueprint,
+            current_count=quiz.question_set.count(),
+            pools=Question_bank.objects.order_by("tag", "level")
+            .values("tag", "level")
+            .annotate(count=models.Count("pk")),
+            opts=self.model._meta,
         )
-        marks = [i[1] for i in marks]
-        marks = dict(Counter(marks))
+        return TemplateResponse(request, "admin/quiz_generate.html", context)
+
+    def quiz_export(self, request, quiz_id):
+        """Download the results of all the quiz takers as one workbook"""
+
+        quiz = Quiz.objects.get(quiz_id=quiz_id)
+        if not self.has_view_permission(request, quiz):
+            raise PermissionDenied
+
+        # the time and memory taken are kept and shown in the quiz exports
+        started = time.monotonic()
+        output = tempfile.TemporaryFile()
+        with PeakRSS() as rss:
+            takers, rows = generate_quiz_results_as_excel(
+                quiz, output, request.user.timeZone
+            )
+        QuizExport.objects.create(
+            quiz=quiz,
+            exported_by=request.user,
+            takers=takers,
+            responses=rows,
+            seconds=time.monotonic() - started,
+            rss_before=rss.before,
+            peak_rss=rss.peak,
+        )
+
+        response = FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"Results {quiz.title}.xlsx",
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        return response
+
+    def quiz_report(self, request, quiz_id):
+
+        quiz = Quiz.objects.get(quiz_id=quiz_id)
+        report = reports.get_quiz_report(quiz)
 
         context = dict(
             self.admin_site.each_context(request),
             title="Report",
             quiz=quiz,
-            marks=json.dumps(marks),
-            totalMarks=totalMarks,
+            report=report,
+            marks=json.dumps(report["histogram"]),
+            totalMarks=report["total_marks"],
             opts=self.model._meta,
             app_label=self.model._meta.app_label,
             change=True,
@@ -286,6 +458,46 @@ class Question_bank_admin(ImportExportModelAdmin):
         def lookups(self, request, model_admin):
             return ()
 
+    def get_urls(self):
+        urls = super(Question_bank_admin, self).get_urls()
+        my_urls = [
+            path(
+                "bulk_import/",
+                self.admin_site.admin_view(self.bulk_import),
+                name="question_bank_bulk_import",
+            ),
+        ]
+        return my_urls + urls
+
+    def bulk_import(self, request):
+        """Upload a large question bank to be imported by the job workers"""
+
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        if request.method == "POST":
+            upload = request.FILES.get("file")
+            if not upload or not upload.name.lower().endswith((".xls", ".xlsx")):
+                messages.error(request, "Please Select An Excel File")
+                return redirect(request.get_full_path())
+            bankImport = QuestionBankImport.objects.create(
+                filename=upload.name, file=upload.read(), uploaded_by=request.user
+            )
+            jobs.enqueue("import_question_bank", import_id=bankImport.pk)
+            messages.success(
+                request, f"{upload.name} will be imported in the background"
+            )
+            return redirect(
+                "admin:quiz_app_questionbankimport_change", bankImport.pk
+            )
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Bulk Import Questions",
+        )
+        return TemplateResponse(request, "admin/question_bank_bulk_import.html", context)
+
     def get_import_formats(self):
         """Restrict import to only excel files"""
 
@@ -330,19 +542,29 @@ class Question_bank_admin(ImportExportModelAdmin):
             if request.POST.get("apply", "") == "Cancel":
                 return redirect(request.get_full_path())
 
-            questions = []
-            for questionDict in queryset:
-                question = Question(
-                    quiz=quiz,
-                    **model_to_dict(questionDict, exclude=["id", "tag", "level"]),
-                )
-                questions.append(question)
-            Question.objects.bulk_create(questions)
+            added = copy_to_quiz(queryset, quiz)
+            # the copy does not send the post_save signal
+            quiz_content_changed(quiz.pk)
+            messages.success(request, f"{added} Questions Added To {quiz.title}")
             return redirect(request.get_full_path())
 
+        # only the counts are shown, the selection can be the whole bank
+        summary = list(
+            queryset.order_by("tag", "level")
+            .values("tag", "level")
+            .annotate(count=models.Count("pk"), marks=models.Sum("marks"))
+        )
+        select_across = request.POST.get("select_across") == "1"
         context = {
-            "question_bank": queryset,
             "quiz": quiz,
+            "current_count": quiz.question_set.count(),
+            "summary": summary,
+            "total_count": sum(row["count"] for row in summary),
+            "total_marks": sum(row["marks"] for row in summary),
+            "select_across": select_across,
+            # posted back even with select_across, the changelist only runs
+            # the action of a confirmation posting some selected ids
+            "selected": request.POST.getlist("_selected_action"),
         }
         return render(request, "admin/question_bank_confirmation.html", context=context)
 
@@ -423,10 +645,159 @@ class QuizTakersAdmin(admin.ModelAdmin):
     fieldsets = ()
 
 
+class JobAdmin(admin.ModelAdmin):
+    """Admin for the background job queue"""
+
+    list_display = (
+        "name",
+        "status",
+        "attempts",
+        "run_at",
+        "created_at",
+    )
+    list_filter = (
+        "status",
+        "name",
+    )
+    readonly_fields = (
+        "name",
+        "payload",
+        "attempts",
+        "locked_at",
+        "last_error",
+        "created_at",
+    )
+    ordering = ("-created_at",)
+
+
+class OutgoingMailAdmin(admin.ModelAdmin):
+    """Admin for the outbox of the mails to deliver"""
+
+    def retry(self, request, queryset):
+        """Deliver the selected dead mails again"""
+
+        count = queryset.filter(status=OutgoingMail.DEAD).update(
+            status=OutgoingMail.PENDING, attempts=0, run_at=timezone.now()
+        )
+        messages.success(request, f"{count} Mails Will Be Sent Again")
+
+    retry.short_description = "Retry Dead Mails"
+
+    list_display = (
+        "subject",
+        "recipients",
+        "status",
+        "attempts",
+        "run_at",
+        "created_at",
+        "sent_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("recipients",)
+    fields = (
+        "subject",
+        "recipients",
+        "status",
+        "attempts",
+        "run_at",
+        "last_error",
+        "created_at",
+        "sent_at",
+    )
+    readonly_fields = fields
+    ordering = ("-created_at",)
+    actions = ["retry"]
+
+    def has_add_permission(self, request):
+        return False
+
+
+class QuestionBankImportAdmin(admin.ModelAdmin):
+    """Admin for the progress of the question bank imports"""
+
+    list_display = (
+        "filename",
+        "status",
+        "progress",
+        "created_count",
+        "duplicate_count",
+        "error_count",
+        "uploaded_by",
+        "created_at",
+    )
+    list_filter = ("status",)
+    fields = (
+        "filename",
+        "status",
+        "progress",
+        "created_count",
+        "duplicate_count",
+        "error_count",
+        "errors",
+        "uploaded_by",
+        "created_at",
+        "finished_at",
+    )
+    readonly_fields = fields
+    ordering = ("-created_at",)
+
+    def get_queryset(self, request):
+        # the uploaded workbook is never shown
+        return super().get_queryset(request).defer("file")
+
+    def has_add_permission(self, request):
+        # uploaded through the bulk import of the question bank
+        return False
+
+
+class QuizExportAdmin(admin.ModelAdmin):
+    """Admin for the time and memory taken by the exports of the results"""
+
+    list_display = (
+        "quiz",
+        "created_at",
+        "exported_by",
+        "takers",
+        "responses",
+        "seconds",
+        "rss_before_mb",
+        "peak_rss_mb",
+    )
+    list_filter = ("quiz",)
+    list_select_related = ("quiz", "exported_by")
+    fields = list_display
+    readonly_fields = fields
+    ordering = ("-created_at",)
+
+    def rss_before_mb(self, obj):
+        return megabytes(obj.rss_before)
+
+    rss_before_mb.short_description = "RSS Before"
+
+    def peak_rss_mb(self, obj):
+        return megabytes(obj.peak_rss)
+
+    peak_rss_mb.short_description = "Peak RSS"
+
+    def has_add_permission(self, request):
+        # recorded by the exports of the quiz admin
+        return False
+
+
+def megabytes(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value / 1024 / 1024:.1f} MB"
+
+
 admin.site.register(Account, AccountAdmin)
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Question_bank, Question_bank_admin)
 admin.site.register(QuizTakers, QuizTakersAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(QuestionBankImport, QuestionBankImportAdmin)
+admin.site.register(OutgoingMail, OutgoingMailAdmin)
+admin.site.register(QuizExport, QuizExportAdmin)
 admin.site.site_header = "Admin"
 admin.site.site_title = "Admin Portal"
 admin.site.index_title = "Welcome to Quiz Masters"
@@ -1,14 +1,17 @@
+import json
+
 from django.contrib import messages
 from django.contrib.auth import authenticate
-from django.core.mail import EmailMultiAlternatives
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.http import HttpResponse
 from django.http.response import JsonResponse
 from django.shortcuts import get_object_or_404, redirect
-from django.template.loader import render_to_string
 from django.utils import timezone
 
+from . import answer_key, jobs, reports, suspicion
 from .excel import generate_result_as_excel
-from .models import Question, Quiz, QuizTakers, Response
+from .models import Quiz, QuizTakers, Response
 
 
 def saveResponse(request):
@@ -17,57 +20,155 @@ def saveResponse(request):
         jsonResponse.status_code = 403
         return jsonResponse
     if request.method == "POST":
-        quizTaker = request.POST.get("quizTaker")
-        question = request.POST.get("question")
+        try:
+            quizTaker_id = int(request.POST.get("quizTaker"))
+            question = int(request.POST.get("question"))
+        except (TypeError, ValueError):
+            jsonResponse = JsonResponse({"error": "Response Could Not Be Saved"})
+            jsonResponse.status_code = 400
+            return jsonResponse
         answer = request.POST.get("answer")
-        question = Question.objects.filter(pk=question).first()
-        response = Response.objects.filter(quiztaker_id=quizTaker, question=question)
-        isCorrect = answer == question.correct
-        if isCorrect:
-            response.update(answer=answer, isCorrect=True, marks=question.marks)
-        else:
-            response.update(answer=answer, isCorrect=False, marks=0)
+        with transaction.atomic():
+            # Lock the attempt like saveResponses, so that the first saves of
+            # a question are applied one after the other
+            quizTaker = (
+                QuizTakers.objects.select_for_update()
+                .filter(pk=quizTaker_id, user=request.user)
+                .order_by()
+                .first()
+            )
+            if not quizTaker:
+                jsonResponse = JsonResponse({"error": "Quiz taker not found"})
+                jsonResponse.status_code = 404
+                return jsonResponse
+            result = answer_key.grade(quizTaker.quiz_id, question, answer)
+            if not result:
+                jsonResponse = JsonResponse({"error": "Response Could Not Be Saved"})
+                jsonResponse.status_code = 400
+                return jsonResponse
+            response = (
+                Response.objects.filter(quiztaker=quizTaker, question_id=question)
+                .order_by("pk")
+                .first()
+            )
+            if not response:
+                response = Response(quiztaker=quizTaker, question_id=question)
+            delta = response.set_answer(answer, *result)
+            response.save()
+            quizTaker.add_to_summary(*delta)
 
     return JsonResponse({"success": "Response successfully saved"})
 
 
-def completed(request):
+def saveResponses(request):
+    """Save a batch of answers of one quiz taker in a single transaction.
+
+    The request carries ``quizTaker`` and ``responses``, a JSON list of
+    ``{"question", "answer", "seq"}`` objects. ``seq`` is a client side
+    counter, an answer is only applied if its ``seq`` is newer than the one
+    already stored so that retried or reordered batches never overwrite a
+    newer answer.
+    """
+
     if not request.user.is_authenticated:
         jsonResponse = JsonResponse({"error": "logged out"})
         jsonResponse.status_code = 403
         return jsonResponse
-    if request.method == "POST":
-        quizTaker = request.POST.get("quizTaker")
-        quizTaker = QuizTakers.objects.get(pk=quizTaker)
-        quizTaker.completed = timezone.now()
-        quizTaker.save()
-        context = {
-            "name": request.user.full_name,
-            "title": quizTaker.quiz.title,
-            "started": quizTaker.started,
-            "completed": quizTaker.completed,
+    try:
+        if request.method != "POST":
+            raise ValueError()
+        quizTaker_id = int(request.POST.get("quizTaker"))
+        latest = {}
+        for item in json.loads(request.POST.get("responses", "[]")):
+            question_id = int(item["question"])
+            seq = int(item["seq"])
+            if question_id not in latest or seq > latest[question_id][1]:
+                latest[question_id] = (str(item.get("answer") or ""), seq)
+    except (ValueError, KeyError, TypeError):
+        jsonResponse = JsonResponse({"error": "Responses Could Not Be Saved"})
+        jsonResponse.status_code = 400
+        return jsonResponse
+
+    with transaction.atomic():
+        # Lock the attempt so that concurrent batches of the same quiz taker
+        # are applied one after the other
+        quizTaker = (
+            QuizTakers.objects.select_for_update()
+            .filter(pk=quizTaker_id, user=request.user)
+            .first()
+        )
+        if not quizTaker:
+            jsonResponse = JsonResponse({"error": "Quiz taker not found"})
+            jsonResponse.status_code = 404
+            return jsonResponse
+
+        graded = {}
+        for question_id, (answer, seq) in latest.items():
+            result = answer_key.grade(quizTaker.quiz_id, question_id, answer)
+            if result:
+                graded[question_id] = result
+        # response rows are created on the first answer of a question
+        existing = {
+            response.question_id: response
+            for response in Response.objects.filter(
+                quiztaker=quizTaker, question_id__in=graded.keys()
+            ).order_by()
         }
-        msg_plain = render_to_string("email/test_confirmation.txt", context)
-        msg_html = render_to_string("email/test_confirmation.html", context)
-        email = EmailMultiAlternatives(
-            "Test submitted successfully",
-            msg_plain,
-            "webmaster@localhost",
-            [request.user.email],
+        changed = []
+        created = []
+        summary = [0, 0, 0]
+        for question_id, result in graded.items():
+            answer, seq = latest[question_id]
+            response = existing.get(question_id)
+            if response is None:
+                response = Response(quiztaker=quizTaker, question_id=question_id)
+                created.append(response)
+            elif seq <= response.sequence:
+                continue
+            else:
+                changed.append(response)
+            delta = response.set_answer(answer, *result)
+            summary = [total + change for total, change in zip(summary, delta)]
+            response.sequence = seq
+        Response.objects.bulk_create(created)
+        Response.objects.bulk_update(
+            changed, ["answer", "sequence", "isCorrect", "marks"]
         )
-        email.attach_alternative(msg_html, "text/html")
+        quizTaker.add_to_summary(*summary)
 
-        responses = (
-            quizTaker.response_set.select_related("question")
-            .all()
-            .order_by("question_id")[::1]
-        )
-        filename = f"Result {request.user.full_name}.xlsx"
-        output = generate_result_as_excel(request, quizTaker.quiz, quizTaker, responses)
-        email.attach(
-            filename, content=output.read(), mimetype="application/vnd.ms-excel"
+    return JsonResponse(
+        {
+            "success": "Responses successfully saved",
+            "saved": {pk: latest[pk][1] for pk in graded},
+        }
+    )
+
+
+def completed(request):
+    if not request.user.is_authenticated:
+        jsonResponse = JsonResponse({"error": "logged out"})
+        jsonResponse.status_code = 403
+        return jsonResponse
+    if request.method == "POST":
+        try:
+            quizTaker_id = int(request.POST.get("quizTaker"))
+        except (TypeError, ValueError):
+            quizTaker_id = None
+        quizTakers = QuizTakers.objects.filter(pk=quizTaker_id, user=request.user)
+        # only the completed column is written, the summary and suspicion
+        # columns are kept up to date by concurrent F() updates
+        updated = quizTakers.filter(completed__isnull=True).update(
+            completed=timezone.now()
         )
-        email.send()
+        if updated == 1:
+            # the update sends no post_save signal
+            reports.invalidate(quizTakers.values_list("quiz_id", flat=True).get())
+            # the confirmation mail is sent by the job workers, once
+            jobs.enqueue("submission_finished", quizTaker_id=quizTaker_id)
+        elif not quizTakers.exists():
+            jsonResponse = JsonResponse({"error": "Quiz taker not found"})
+            jsonResponse.status_code = 404
+            return jsonResponse
     return JsonResponse({"success": "Quiz successfully saved"})
 
 
@@ -78,15 +179,11 @@ def export_result(request, quiz_id):
         messages.info(request, "The Test has not been submitted yet.")
         return redirect("quiz", quiz_id=quiz.quiz_id)
 
-    responses = (
-        quizTaker.response_set.select_related("question")
-        .all()
-        .order_by("question_id")[::1]
-    )
+    responses = quizTaker.responses_with_unanswered()
 
     filename = f"Result {request.user.full_name}.xlsx"
     response = HttpResponse(
-        generate_result_as_excel(request, quiz, quizTaker, responses),
+        generate_result_as_excel(request.user, quiz, quizTaker, responses),
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
     response["Content-Disposition"] = f"attachment; filename={filename}"
@@ -111,13 +208,22 @@ def save_extra(request):
         extra = request.POST.get("extra")
         # extra = json.loads(extra)
         quiz_id = request.POST.get("quiz")
-        quiz = get_object_or_404(Quiz, quiz_id=quiz_id)
-        quizTaker = QuizTakers.objects.get(quiz=quiz, user=request.user)
-        quizTaker.extra = extra
-        quizTaker.save()
+        try:
+            # only the extra column is written, a full save could undo a
+            # concurrent increase of the suspicion count
+            updated = QuizTakers.objects.filter(
+                quiz_id=quiz_id, user_id=request.user.pk
+            ).update(extra=extra)
+        except ValidationError:
+            updated = 0
+        if not updated:
+            jsonResponse = JsonResponse({"error": "Quiz taker not found"})
+            jsonResponse.status_code = 404
+            return jsonResponse
         return JsonResponse({"success": "Extra Information saved successfully"})
     jsonResponse = JsonResponse({"error": "Extra Information Could Not Be Saved"})
     jsonResponse.status_code = 400
+    return jsonResponse
 
 
 def increase_suspicious(request):
@@ -125,17 +231,15 @@ def increase_suspicious(request):
         user = request.user
         quiz_id = request.POST.get("quiz")
         try:
-            quiz = get_object_or_404(Quiz, quiz_id=quiz_id)
-            quizTaker = get_object_or_404(QuizTakers, quiz=quiz, user=user)
-            quizTaker.suspicion_count += 1
-            quizTaker.save()
-            max_reached = quizTaker.suspicion_count >= quiz.max_suspicion_count
+            suspicion.increase(quiz_id, user.pk)
+            max_reached = suspicion.max_reached(quiz_id, user.pk)
             return JsonResponse(
                 {"success": "Suspicious increased", "max_reached": max_reached}
             )
-        except:
+        except (QuizTakers.DoesNotExist, ValidationError):
             pass
 
     jsonResponse = JsonResponse({"error": "Suspicious couldn't be increased"})
     jsonResponse.status_code = 400
+    return jsonResponse
 
@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import payload
+from .models import Question
+
+DEFAULTS = {
+    "MAX_QUIZZES": 64,
+    "TIMEOUT": 300,
+}
+
+
+def get_setting(name):
+    """Read a value of the ANSWER_KEY_CACHE setting, falling back to the defaults"""
+
+    return getattr(settings, "ANSWER_KEY_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def digest(answer) -> bytes:
+    """Hash an answer so that the key does not keep the full answer texts"""
+
+    return hashlib.blake2b(str(answer).encode(), digest_size=8).digest()
+
+
+class AnswerKeyCache:
+    """LRU cache of the answer keys of the most recently graded quizzes
+
+    An answer key maps the question id to the digest of the correct answer and
+    the marks of the question. Each entry keeps the content version of its
+    quiz, shared by all the processes through the cache and bumped on every
+    change of the quiz or its questions, and is reloaded once the version
+    differs. A change made through another process is so picked up within the
+    LOCAL_TIMEOUT of the cache. Entries also expire after TIMEOUT seconds.
+    """
+
+    def __init__(self, max_quizzes, timeout):
+        self.max_quizzes = max_quizzes
+        self.timeout = timeout
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id) -> dict:
+        # read before the questions, a change in between only reloads again
+        version = payload.get_version(quiz_id)
+        quiz_id = str(quiz_id)
+        with self._lock:
+            entry = self._keys.get(quiz_id)
+            if entry and entry[0] > time.monotonic() and entry[1] == version:
+                self._keys.move_to_end(quiz_id)
+                return entry[2]
+
+        key = {
+            pk: (digest(correct), marks)
+            for pk, correct, marks in Question.objects.filter(
+                quiz_id=quiz_id
+            ).values_list("pk", "correct", "marks")
+        }
+        with self._lock:
+            self._keys[quiz_id] = (time.monotonic() + self.timeout, version, key)
+            self._keys.move_to_end(quiz_id)
+            while len(self._keys) > self.max_quizzes:
+                self._keys.popitem(last=False)
+        return key
+
+    def invalidate(self, quiz_id):
+        with self._lock:
+            self._keys.pop(str(quiz_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+answer_keys = AnswerKeyCache(get_setting("MAX_QUIZZES"), get_setting("TIMEOUT"))
+
+
+def get_answer_key(quiz_id) -> dict:
+    """Get the answer key of a quiz, loading it on the first use
+
+    Args:
+        quiz_id (UUID): The id of the quiz
+
+    Returns:
+        dict: question id -> (digest of the correct answer, marks)
+    """
+
+    return answer_keys.get(quiz_id)
+
+
+def grade(quiz_id, question_id, answer):
+    """Grade an answer against the cached answer key of the quiz
+
+    Args:
+        quiz_id (UUID): The id of the quiz
+        question_id (int): The id of the question
+        answer (str): The answer given by the quiz taker
+
+    Returns:
+        tuple: (isCorrect, marks) or None if the question is not in the quiz
+    """
+
+    entry = get_answer_key(quiz_id).get(int(question_id))
+    if entry is None:
+        return None
+    correct, marks = entry
+    if digest(answer) == correct:
+        return True, marks
+    return False, 0
+
+
+def invalidate(quiz_id):
+    """Drop the cached answer key of a quiz"""
+
+    answer_keys.invalidate(quiz_id)
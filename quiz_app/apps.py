@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class QuizAppConfig(AppConfig):
     name = 'quiz_app'
+
+    def ready(self):
+        # register the signal receivers and the handlers of the background jobs
+        from . import metrics, signals, tasks  # noqa: F401
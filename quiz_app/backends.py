@@ -1,23 +1,20 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.backends import AllowAllUsersModelBackend
 
 
-class CaseInsensitiveModelBackend(ModelBackend):
+class CaseInsensitiveModelBackend(AllowAllUsersModelBackend):
+    """Authenticate by email whatever its case
+
+    The emails are stored lowercased, so the given one is lowercased as well
+    and looked up exactly on the unique index of account.email. Inactive
+    users are authenticated too, so that they can be asked to verify their
+    email.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
         if username is None:
             username = kwargs.get(UserModel.USERNAME_FIELD)
-
-        try:
-            case_insensitive_username_field = "{}__iexact".format(
-                UserModel.USERNAME_FIELD
-            )
-            user = UserModel._default_manager.get(
-                **{case_insensitive_username_field: username}
-            )
-        except UserModel.DoesNotExist:
-            UserModel().set_password(password)
-
-        else:
-            if user.check_password(password) and self.user_can_authenticate(user):
-                return user
+        if username is not None:
+            username = UserModel.normalize_username(username)
+        return super().authenticate(request, username=username, password=password)
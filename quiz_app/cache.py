@@ -0,0 +1,175 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+# The local tier and counters of each shared cache alias, shared by the
+# threads of the process as django gives every thread its own cache instance
+_processes = {}
+_processes_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """Per process LRU cache in front of a shared cache
+
+    Reads are served from the local tier while its copy is fresh, writes and
+    deletes go to both tiers. A key changed through another process can be
+    seen stale for at most LOCAL_TIMEOUT seconds. add and incr are atomic
+    operations of the shared cache, so they are never answered locally.
+
+    Configured with the alias of the shared cache::
+
+        "default": {
+            "BACKEND": "quiz_app.cache.TieredCache",
+            "OPTIONS": {"SHARED": "shared", "MAX_ENTRIES": 1000, "LOCAL_TIMEOUT": 5},
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED", "shared")
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        with _processes_lock:
+            if self._shared_alias not in _processes:
+                _processes[self._shared_alias] = (
+                    OrderedDict(),
+                    threading.Lock(),
+                    {
+                        "local": {"hits": 0, "misses": 0},
+                        "shared": {"hits": 0, "misses": 0},
+                    },
+                )
+            self._local, self._lock, self.counters = _processes[self._shared_alias]
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def _local_set(self, key, value, timeout):
+        if timeout is not None and timeout <= 0:
+            self._local_delete(key)
+            return
+        lifetime = self.local_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout)
+        # pickled like the locmem backend so callers can't change cached values
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        entry = (time.monotonic() + lifetime, pickled)
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _count(self, tier, result):
+        with self._lock:
+            self.counters[tier][result] += 1
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            self._count("local", "hits")
+            return value
+        self._count("local", "misses")
+
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count("shared", "misses")
+            return default
+        self._count("shared", "hits")
+        self._local_set(local_key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self.make_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self.make_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_key(key, version=version))
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self.make_key(key, version=version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version=version))
+        return self.shared.decr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def stats(self) -> dict:
+        """The hit and miss counters of both tiers of this process
+
+        A local miss is looked up in the shared tier, so the requests served
+        by the shared tier are its hits.
+        """
+
+        with self._lock:
+            return {
+                "local": dict(self.counters["local"], entries=len(self._local)),
+                "shared": dict(self.counters["shared"]),
+            }
+
+
+def tiered_stats() -> dict:
+    """The stats of every tiered cache of the CACHES setting
+
+    Returns:
+        dict: cache alias -> TieredCache.stats()
+    """
+
+    return {
+        alias: caches[alias].stats()
+        for alias, params in settings.CACHES.items()
+        if params["BACKEND"] == "quiz_app.cache.TieredCache"
+    }
@@ -0,0 +1,103 @@
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .models import QuizTakers
+
+DEFAULTS = {
+    "MAX_AGE": 7 * 24 * 60 * 60,
+}
+
+SALT = "quiz_app.entry"
+
+
+def get_setting(name):
+    """Read a value of the ENTRY_TOKENS setting, falling back to the defaults"""
+
+    return getattr(settings, "ENTRY_TOKENS", {}).get(name, DEFAULTS[name])
+
+
+def make_token(quizTaker) -> str:
+    """Sign the id and the entry nonce of a quiz taker"""
+
+    return signing.TimestampSigner(salt=SALT).sign(
+        f"{quizTaker.pk}:{quizTaker.entry_nonce}"
+    )
+
+
+def issue_tokens(quiz) -> list:
+    """Make the entry tokens of all the quiz takers of a quiz
+
+    The quiz takers without a nonce, who never had a link or already used
+    it, are given one. The links not used yet stay valid.
+
+    Returns:
+        list: (quiz taker, token) of every quiz taker, with its user
+    """
+
+    quizTakers = list(
+        QuizTakers.objects.filter(quiz=quiz).select_related("user").order_by("pk")
+    )
+    missing = [quizTaker for quizTaker in quizTakers if not quizTaker.entry_nonce]
+    for quizTaker in missing:
+        quizTaker.entry_nonce = secrets.token_hex(16)
+    QuizTakers.objects.bulk_update(missing, ["entry_nonce"], batch_size=1000)
+    return [(quizTaker, make_token(quizTaker)) for quizTaker in quizTakers]
+
+
+def check_token(token):
+    """Check an entry token without using it up
+
+    The signature and age are checked without the database, then the quiz
+    taker is read by its primary key.
+
+    Returns:
+        QuizTakers: the quiz taker of the token with its user and quiz, or None
+            if the token is invalid, expired, used or its quiz has ended
+    """
+
+    try:
+        value = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=get_setting("MAX_AGE")
+        )
+        pk, nonce = value.split(":")
+        pk = int(pk)
+    except (signing.BadSignature, ValueError):
+        return None
+    if not nonce:
+        return None
+
+    quizTaker = (
+        QuizTakers.objects.select_related("user", "quiz").filter(pk=pk).first()
+    )
+    if (
+        not quizTaker
+        or not constant_time_compare(quizTaker.entry_nonce, nonce)
+        or quizTaker.quiz.end_date < timezone.now()
+    ):
+        return None
+    return quizTaker
+
+
+def use_token(token):
+    """Check an entry token and use it up
+
+    The nonce is cleared by a conditional update so that a link works only
+    once, even when opened twice at once.
+
+    Returns:
+        QuizTakers: the quiz taker of the token, or None if it can't be used
+    """
+
+    quizTaker = check_token(token)
+    if not quizTaker:
+        return None
+    if not QuizTakers.objects.filter(
+        pk=quizTaker.pk, entry_nonce=quizTaker.entry_nonce
+    ).update(entry_nonce=""):
+        return None
+    quizTaker.entry_nonce = ""
+    return quizTaker
@@ -5,177 +5,338 @@ import pytz
 import xlsxwriter
 from django.utils.timezone import datetime
 
+from .models import QuizTakers, Response
 
-def generate_result_as_excel(request, quiz, quizTaker, responses):
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output)
-    worksheet = workbook.add_worksheet(name="Result")
+GREEN = {"bg_color": "#C6EFCE", "font_color": "#006100"}
+RED = {"bg_color": "#FFC7CE", "font_color": "#9C0006"}
+BLUE = {"bg_color": "#b4daff", "font_color": "#003171"}
+Y_BORDER = {"top": 1, "bottom": 1}
 
-    worksheet.set_column("A:A", 20)
-    worksheet.set_column("B:B", 60)
-    worksheet.set_column("D:H", 20)
-    worksheet.set_column("J:K", 30)
+# The formats used by the reports, a format is only added to a workbook the
+# first time it is used
+FORMATS = {
+    "bold": {"bold": True, "text_wrap": True},
+    "bold_y": {"bold": True, **Y_BORDER},
+    "date": {"num_format": "yyyy-mm-dd hh:mm:ss AM/PM"},
+    "green": GREEN,
+    "green_y": {**GREEN, "text_wrap": True, **Y_BORDER},
+    "green_bold": {**GREEN, "bold": True, "text_wrap": True},
+    "red": RED,
+    "red_y": {**RED, "text_wrap": True, **Y_BORDER},
+    "red_bold": {**RED, "bold": True, "text_wrap": True},
+    "blue_y": {**BLUE, "text_wrap": True, **Y_BORDER},
+}
 
-    bold_format = workbook.add_format({"bold": True, "text_wrap": True,})
-    bold_y_format = workbook.add_format({"bold": True, "top": 1, "bottom": 1,})
-    green_format = workbook.add_format(
-        {"bg_color": "#C6EFCE", "font_color": "#006100", "text_wrap": "true",}
-    )
-    green_y_format = workbook.add_format(
-        {
-            "bg_color": "#C6EFCE",
-            "font_color": "#006100",
-            "text_wrap": "true",
-            "top": 1,
-            "bottom": 1,
-        }
-    )
-    green_bold_format = workbook.add_format(
-        {
-            "bold": True,
-            "bg_color": "#C6EFCE",
-            "font_color": "#006100",
-            "text_wrap": "true",
-        }
-    )
-    red_format = workbook.add_format(
-        {"bg_color": "#FFC7CE", "font_color": "#9C0006", "text_wrap": True,}
-    )
-    red_y_format = workbook.add_format(
-        {
-            "bg_color": "#FFC7CE",
-            "font_color": "#9C0006",
-            "text_wrap": "true",
-            "top": 1,
-            "bottom": 1,
-        }
-    )
-    red_bold_format = workbook.add_format(
-        {
-            "bold": True,
-            "bg_color": "#FFC7CE",
-            "font_color": "#9C0006",
-            "text_wrap": "true",
-        }
-    )
-    blue_format = workbook.add_format(
-        {"bg_color": "#b4daff", "font_color": "#003171", "text_wrap": True,}
-    )
-    blue_y_format = workbook.add_format(
-        {
-            "bg_color": "#b4daff",
-            "font_color": "#003171",
-            "text_wrap": "true",
-            "top": 1,
-            "bottom": 1,
-        }
-    )
-    blue_bold_format = workbook.add_format(
-        {
-            "bold": True,
-            "bg_color": "#b4daff",
-            "font_color": "#003171",
-            "text_wrap": "true",
-        }
-    )
+# %-I (hour without padding) is not supported by the windows strftime
+try:
+    DATETIME_FORMAT = "%Y-%m-%d %-I:%M:%S %p"
+    datetime.now().strftime(DATETIME_FORMAT)
+except ValueError:
+    DATETIME_FORMAT = "%Y-%m-%d %#I:%M:%S %p"
 
-    rNo = 1
 
-    worksheet.merge_range(f"A{rNo}:B{rNo}", request.user.full_name, bold_format)
-    rNo += 1
-    worksheet.merge_range(
-        f"A{rNo}:B{rNo}", f"{request.user.email.upper()}", bold_format
-    )
-    rNo += 1
-    worksheet.merge_range(f"A{rNo}:B{rNo}", f"Quiz: {quiz.title}", bold_format)
-    rNo += 1
-    worksheet.merge_range(f"A{rNo}:B{rNo}", "")
-    rNo += 1
-    descLength = len(quiz.description.split("\n"))
-    worksheet.merge_range(
-        f"A{rNo}:B{rNo + descLength - 1}", f"{quiz.description}", bold_format
+class ReportWriter:
+    """Thin wrapper around an xlsxwriter workbook shared by the reports
+
+    Cells are written with integer (row, col) coordinates and whole rows at a
+    time. Text is written as is, answers of the quiz takers are never turned
+    into formulas or urls.
+
+    Args:
+        output (file): The binary file the workbook is written to
+        constant_memory (bool): Flush every row to disk once the next row is
+            started, rows of a sheet have to be written in order
+    """
+
+    def __init__(self, output, constant_memory=False):
+        self.output = output
+        self.workbook = xlsxwriter.Workbook(
+            output,
+            {
+                "constant_memory": constant_memory,
+                "in_memory": not constant_memory,
+                "strings_to_formulas": False,
+                "strings_to_urls": False,
+            },
+        )
+        self.formats = {}
+
+    def format(self, name):
+        """Get a format of the FORMATS spec, adding it to the workbook if needed"""
+
+        if name is None:
+            return None
+        if name not in self.formats:
+            self.formats[name] = self.workbook.add_format(FORMATS[name])
+        return self.formats[name]
+
+    def add_worksheet(self, name, widths=()):
+        """Add a worksheet
+
+        Args:
+            name (str): The name of the sheet
+            widths (iterable): (first column, last column, width) tuples
+        """
+
+        worksheet = self.workbook.add_worksheet(name=name)
+        for first, last, width in widths:
+            worksheet.set_column(first, last, width)
+        return worksheet
+
+    def close(self):
+        """Finish the workbook and rewind the output"""
+
+        self.workbook.close()
+        self.output.seek(0)
+        return self.output
+
+
+def format_datetime(value, timeZone) -> str:
+    return value.astimezone(pytz.timezone(timeZone)).strftime(DATETIME_FORMAT)
+
+
+def generate_result_as_excel(user, quiz, quizTaker, responses, constant_memory=False):
+    """Write the result of one quiz taker into a workbook
+
+    Args:
+        user (Account): The quiz taker
+        quiz (Quiz): The quiz
+        quizTaker (QuizTakers): The attempt of the user
+        responses (list): The responses of the attempt with their questions
+        constant_memory (bool): Write the workbook in constant memory mode
+
+    Returns:
+        BytesIO: the workbook
+    """
+
+    writer = ReportWriter(io.BytesIO(), constant_memory)
+    bold = writer.format("bold")
+    worksheet = writer.add_worksheet(
+        "Result", [(0, 0, 20), (1, 1, 60), (3, 7, 20), (9, 10, 30)]
     )
 
-    rNo += descLength + 1
+    row = 0
+    worksheet.merge_range(row, 0, row, 1, user.full_name, bold)
+    worksheet.merge_range(row + 1, 0, row + 1, 1, user.email.upper(), bold)
+    worksheet.merge_range(row + 2, 0, row + 2, 1, f"Quiz: {quiz.title}", bold)
+    worksheet.merge_range(row + 3, 0, row + 3, 1, "")
+    row += 4
+    descLength = len(quiz.description.split("\n"))
+    worksheet.merge_range(row, 0, row + descLength - 1, 1, quiz.description, bold)
+    row += descLength + 1
 
-    extra = json.loads(quizTaker.extra)
+    extra = json.loads(quizTaker.extra or "{}")
     for key, value in extra.items():
-        worksheet.write(f"A{rNo}", f"{key}:", bold_format)
-        worksheet.write(f"B{rNo}", f"{value}", bold_format)
-        rNo += 1
-
-    rNo += 1
-    started = quizTaker.started.astimezone(tz=pytz.timezone(request.user.timeZone))
-    try:
-        started = datetime.strftime(started, "%Y-%m-%d %-I:%M:%S %p")
-    except ValueError:
-        started = datetime.strftime(started, "%Y-%m-%d %#I:%M:%S %p")
-    worksheet.write(f"A{rNo}", "Started At:", bold_format)
-    worksheet.write(f"B{rNo}", f"{started}", bold_format)
-
-    rNo += 1
-    ended = quizTaker.completed.astimezone(tz=pytz.timezone(request.user.timeZone))
-    try:
-        ended = datetime.strftime(ended, "%Y-%m-%d %-I:%M:%S %p")
-    except ValueError:
-        ended = datetime.strftime(ended, "%Y-%m-%d %#I:%M:%S %p")
-    worksheet.write(f"A{rNo}", "Submitted At:", bold_format)
-    worksheet.write(f"B{rNo}", f"{ended}", bold_format)
-    rNo += 2
-
-    total_marks = sum([r.question.marks for r in responses])
-    marks_obtained = sum([q.marks for q in responses])
-    worksheet.merge_range(f"A{rNo}:B{rNo}", f"Total Marks: {total_marks}", bold_format)
-    rNo += 1
+        worksheet.write_row(row, 0, [f"{key}:", f"{value}"], bold)
+        row += 1
+
+    row += 1
+    started = format_datetime(quizTaker.started, user.timeZone)
+    ended = format_datetime(quizTaker.ended_at, user.timeZone)
+    worksheet.write_row(row, 0, ["Started At:", started], bold)
+    worksheet.write_row(row + 1, 0, ["Submitted At:", ended], bold)
+    row += 3
+
+    total_marks = sum(r.question.marks for r in responses)
+    marks_obtained = sum(r.marks for r in responses)
+    worksheet.merge_range(row, 0, row, 1, f"Total Marks: {total_marks}", bold)
     worksheet.merge_range(
-        f"A{rNo}:B{rNo}", f"Marks Obtained: {marks_obtained}", bold_format
+        row + 1, 0, row + 1, 1, f"Marks Obtained: {marks_obtained}", bold
     )
-    rNo += 2
-    if 100 * marks_obtained / total_marks > 33:
-        worksheet.merge_range(f"A{rNo}:B{rNo}", f"Status: Passed", green_bold_format)
+    row += 3
+    if total_marks and 100 * marks_obtained / total_marks > 33:
+        status, status_format = "Status: Passed", writer.format("green_bold")
     else:
-        worksheet.merge_range(f"A{rNo}:B{rNo}", f"Status: Failed", red_bold_format)
-
-    rNo += 2
-    worksheet.write(f"A{rNo}", "Que No.", bold_y_format)
-    worksheet.write(f"B{rNo}", "Question Statement", bold_y_format)
-    worksheet.write(f"C{rNo}", "", bold_y_format)
-    worksheet.write(f"D{rNo}", "Option 1", bold_y_format)
-    worksheet.write(f"E{rNo}", "Option 2", bold_y_format)
-    worksheet.write(f"F{rNo}", "Option 3", bold_y_format)
-    worksheet.write(f"G{rNo}", "Option 4", bold_y_format)
-    worksheet.write(f"H{rNo}", "Option 5", bold_y_format)
-    worksheet.write(f"I{rNo}", "", bold_y_format)
-    worksheet.write(f"J{rNo}", "Correct Answer", bold_y_format)
-    worksheet.write(f"K{rNo}", "Your Answer", bold_y_format)
-    worksheet.write(f"L{rNo}", "Is Correct", bold_y_format)
-    worksheet.write(f"M{rNo}", "Marks", bold_y_format)
-
-    for i, response in enumerate(responses):
-        rNo += 1
+        status, status_format = "Status: Failed", writer.format("red_bold")
+    worksheet.merge_range(row, 0, row, 1, status, status_format)
+
+    row += 2
+    worksheet.write_row(
+        row,
+        0,
+        [
+            "Que No.",
+            "Question Statement",
+            "",
+            "Option 1",
+            "Option 2",
+            "Option 3",
+            "Option 4",
+            "Option 5",
+            "",
+            "Correct Answer",
+            "Your Answer",
+            "Is Correct",
+            "Marks",
+        ],
+        writer.format("bold_y"),
+    )
+
+    green, red, blue = (writer.format(f"{c}_y") for c in ("green", "red", "blue"))
+    for i, response in enumerate(responses, start=1):
+        question = response.question
         if response.isCorrect:
-            format = green_y_format
+            format = green
+        elif response.answer == "":
+            format = blue
+        else:
+            format = red
+        worksheet.write_row(
+            row + i,
+            0,
+            [
+                i,
+                str(question.title),
+                "",
+                str(question.choice_1),
+                str(question.choice_2),
+                str(question.choice_3),
+                str(question.choice_4),
+                str(question.choice_5),
+                "",
+                str(question.correct),
+                str(response.answer),
+                str(response.isCorrect),
+                response.marks,
+            ],
+            format,
+        )
+
+    return writer.close()
+
+
+def generate_quiz_results_as_excel(quiz, output, timeZone="UTC"):
+    """Write the results of every quiz taker of a quiz into one workbook
+
+    The workbook has a summary sheet with one row per quiz taker and a
+    responses sheet with one row per response. It is written in
+    constant_memory mode from server side cursors, so only one row of each
+    sheet is held in memory at a time.
+
+    Args:
+        quiz (Quiz): The quiz to export
+        output (file): A seekable binary file the workbook is written to
+        timeZone (str): The time zone used for the dates
+
+    Returns:
+        tuple: the number of quiz takers and of responses written
+    """
+
+    tz = pytz.timezone(timeZone)
+    writer = ReportWriter(output, constant_memory=True)
+    bold_y_format = writer.format("bold_y")
+    date_format = writer.format("date")
+    green_format = writer.format("green")
+    red_format = writer.format("red")
+
+    def local(value):
+        return value.astimezone(tz).replace(tzinfo=None)
+
+    summary = writer.add_worksheet("Summary", [(0, 2, 30), (3, 4, 22), (5, 10, 12)])
+    summary.write_row(
+        0,
+        0,
+        [
+            "Name",
+            "Email",
+            "Extra",
+            "Started At",
+            "Submitted At",
+            "Answered",
+            "Correct",
+            "Marks",
+            "Total Marks",
+            "Status",
+            "Suspicion Count",
+        ],
+        bold_y_format,
+    )
+    quizTakers = (
+        QuizTakers.objects.filter(quiz=quiz)
+        .order_by("user__email")
+        .values_list(
+            "user__full_name",
+            "user__email",
+            "extra",
+            "started",
+            "completed",
+            "answered_count",
+            "correct_count",
+            "marks_obtained",
+            "total_marks",
+            "suspicion_count",
+        )
+    )
+    takers = 0
+    for row in quizTakers.iterator(chunk_size=2000):
+        takers += 1
+        name, email, extra, started, completed, *counts, suspicion = row
+        answered, correct, marks, total = counts
+        passed = bool(total) and 100 * marks / total > 33
+        summary.write_row(takers, 0, [name, email, extra or ""])
+        for col, value in ((3, started), (4, completed)):
+            if value:
+                summary.write_datetime(takers, col, local(value), date_format)
+        summary.write_row(takers, 5, counts)
+        if not started:
+            summary.write(takers, 9, "Missed")
+        elif passed:
+            summary.write(takers, 9, "Passed", green_format)
         else:
-            if response.answer == "":
-                format = blue_y_format
-            else:
-                format = red_y_format
-        worksheet.write(f"A{rNo}", i + 1, format)
-        worksheet.write(f"B{rNo}", f"{response.question.title}", format)
-        worksheet.write(f"C{rNo}", "", format)
-        worksheet.write(f"D{rNo}", f"{response.question.choice_1}", format)
-        worksheet.write(f"E{rNo}", f"{response.question.choice_2}", format)
-        worksheet.write(f"F{rNo}", f"{response.question.choice_3}", format)
-        worksheet.write(f"G{rNo}", f"{response.question.choice_4}", format)
-        worksheet.write(f"H{rNo}", f"{response.question.choice_5}", format)
-        worksheet.write(f"I{rNo}", "", format)
-        worksheet.write(f"J{rNo}", f"{response.question.correct}", format)
-        worksheet.write(f"K{rNo}", f"{response.answer}", format)
-        worksheet.write(f"L{rNo}", f"{response.isCorrect}", format)
-        worksheet.write(f"M{rNo}", response.marks, format)
-
-    workbook.close()
-
-    output.seek(0)
-
-    return output
+            summary.write(takers, 9, "Failed", red_format)
+        summary.write(takers, 10, suspicion)
+
+    questions = [
+        (pk, number, title, correct)
+        for number, (pk, title, correct) in enumerate(
+            quiz.question_set.order_by("pk").values_list("pk", "title", "correct"),
+            start=1,
+        )
+    ]
+    sheet = writer.add_worksheet("Responses", [(0, 0, 30), (2, 2, 60), (3, 4, 30)])
+    sheet.write_row(
+        0,
+        0,
+        [
+            "Email",
+            "Que No.",
+            "Question Statement",
+            "Correct Answer",
+            "Answer",
+            "Is Correct",
+            "Marks",
+        ],
+        bold_y_format,
+    )
+    # Response rows only exist for answered questions. Both cursors return
+    # the quiz takers in the same order, merging them writes a blank row for
+    # every question a quiz taker left unanswered.
+    started = (
+        QuizTakers.objects.filter(quiz=quiz, started__isnull=False)
+        .order_by("user__email", "pk")
+        .values_list("pk", "user__email")
+    )
+    answered = (
+        Response.objects.filter(quiztaker__quiz=quiz, quiztaker__started__isnull=False)
+        .order_by("quiztaker__user__email", "quiztaker_id", "question_id")
+        .values_list("quiztaker_id", "question_id", "answer", "isCorrect", "marks")
+        .iterator(chunk_size=2000)
+    )
+    response = next(answered, None)
+    rows = 0
+    for quizTaker_id, email in started.iterator(chunk_size=2000):
+        for question_id, number, title, correct in questions:
+            answer, isCorrect, marks = "", False, 0
+            if response and response[:2] == (quizTaker_id, question_id):
+                answer, isCorrect, marks = response[2:]
+                response = next(answered, None)
+            rows += 1
+            sheet.write_row(
+                rows,
+                0,
+                [email, number, title, correct, answer or "", str(isCorrect), marks],
+                green_format if isCorrect else (red_format if answer else None),
+            )
+
+    writer.close()
+    return takers, rows
@@ -0,0 +1,134 @@
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "CONCURRENCY": 2,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF": 30,
+    "POLL_INTERVAL": 1,
+    "LOCK_TIMEOUT": 600,
+}
+
+_handlers = {}
+
+
+def get_setting(name):
+    """Read a value of the JOB_QUEUE setting, falling back to the defaults"""
+
+    return getattr(settings, "JOB_QUEUE", {}).get(name, DEFAULTS[name])
+
+
+def handler(name):
+    """Register the decorated function as the handler of the given job name
+
+    Args:
+        name (str): The name used to enqueue the job
+    """
+
+    def register(func):
+        _handlers[name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, **payload):
+    """Add a job to the queue
+
+    Args:
+        name (str): The name of a registered job
+        **payload: JSON serializable keyword arguments passed to the handler
+
+    Returns:
+        Job: the queued job
+    """
+
+    return Job.objects.create(name=name, payload=json.dumps(payload))
+
+
+def claim():
+    """Lock the next due job and mark it as running
+
+    Jobs left running by a dead worker are picked up again after
+    LOCK_TIMEOUT seconds.
+
+    Returns:
+        Job: the claimed job or None if there is nothing to do
+    """
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=get_setting("LOCK_TIMEOUT"))
+    with transaction.atomic():
+        queryset = Job.objects.filter(
+            Q(status=Job.PENDING, run_at__lte=now)
+            | Q(status=Job.RUNNING, locked_at__lt=stale)
+        ).order_by("run_at")
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        else:
+            queryset = queryset.select_for_update()
+        job = queryset.first()
+        if not job:
+            return None
+        job.status = Job.RUNNING
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=["status", "locked_at", "attempts"])
+    return job
+
+
+def run(job):
+    """Run the handler of a claimed job and record the outcome
+
+    A failed job is retried with an exponential backoff until it has been
+    attempted MAX_ATTEMPTS times.
+    """
+
+    try:
+        func = _handlers[job.name]
+        func(**json.loads(job.payload))
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= get_setting("MAX_ATTEMPTS"):
+            job.status = Job.FAILED
+            logger.error("Job %s failed: %s", job.pk, job.last_error)
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=get_setting("BACKOFF") * 2 ** (job.attempts - 1)
+            )
+    else:
+        job.status = Job.DONE
+        job.last_error = None
+    job.locked_at = None
+    job.save(update_fields=["status", "run_at", "locked_at", "last_error"])
+
+
+def work(burst=False):
+    """Process jobs until stopped
+
+    Args:
+        burst (bool): Return once the queue is empty instead of polling
+    """
+
+    while True:
+        close_old_connections()
+        job = claim()
+        if job:
+            run(job)
+            continue
+        if burst:
+            return
+        time.sleep(get_setting("POLL_INTERVAL"))
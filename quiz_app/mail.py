@@ -0,0 +1,168 @@
+import logging
+import pickle
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutgoingMail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+    "BATCH_SIZE": 50,
+    "RATE": 10,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF": 30,
+    "POLL_INTERVAL": 1,
+    "LOCK_TIMEOUT": 600,
+}
+
+
+def get_setting(name):
+    """Read a value of the MAIL_OUTBOX setting, falling back to the defaults"""
+
+    return getattr(settings, "MAIL_OUTBOX", {}).get(name, DEFAULTS[name])
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Email backend which stores the messages in the outbox instead of
+    delivering them, the sender process delivers them later
+
+    Set as the EMAIL_BACKEND so that every mail sent by the project or its
+    apps goes through the outbox, the backend actually delivering the mails
+    is MAIL_OUTBOX BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        mails = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            # the connection is the one of the sender once unpickled
+            message.connection = None
+            mails.append(
+                OutgoingMail(
+                    subject=str(message.subject)[:255],
+                    recipients=", ".join(message.recipients()),
+                    message=pickle.dumps(message, pickle.HIGHEST_PROTOCOL),
+                )
+            )
+        OutgoingMail.objects.bulk_create(mails)
+        return len(mails)
+
+
+def claim(size):
+    """Lock a batch of due mails and mark them as being sent
+
+    Mails left sending by a dead sender are picked up again after
+    LOCK_TIMEOUT seconds.
+
+    Returns:
+        list: the claimed mails
+    """
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=get_setting("LOCK_TIMEOUT"))
+    with transaction.atomic():
+        queryset = OutgoingMail.objects.filter(
+            Q(status=OutgoingMail.PENDING, run_at__lte=now)
+            | Q(status=OutgoingMail.SENDING, locked_at__lt=stale)
+        ).order_by("run_at")
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        else:
+            queryset = queryset.select_for_update()
+        mails = list(queryset[:size])
+        OutgoingMail.objects.filter(pk__in=[mail.pk for mail in mails]).update(
+            status=OutgoingMail.SENDING, locked_at=now
+        )
+    return mails
+
+
+def failed(mail, error):
+    """Retry a mail with an exponential backoff, or give up on it once it has
+    been attempted MAX_ATTEMPTS times"""
+
+    mail.attempts += 1
+    mail.last_error = error
+    if mail.attempts >= get_setting("MAX_ATTEMPTS"):
+        mail.status = OutgoingMail.DEAD
+        logger.error("Mail %s to %s is dead: %s", mail.pk, mail.recipients, error)
+    else:
+        mail.status = OutgoingMail.PENDING
+        mail.run_at = timezone.now() + timedelta(
+            seconds=get_setting("BACKOFF") * 2 ** (mail.attempts - 1)
+        )
+    mail.locked_at = None
+    mail.save(update_fields=["status", "attempts", "run_at", "locked_at", "last_error"])
+
+
+def deliver(mails) -> int:
+    """Send a batch of mails over a single connection of MAIL_OUTBOX BACKEND
+
+    At most RATE mails are sent per second.
+
+    Returns:
+        int: the number of mails sent
+    """
+
+    mailer = get_connection(get_setting("BACKEND"))
+    try:
+        mailer.open()
+    except Exception:
+        error = traceback.format_exc()
+        for mail in mails:
+            failed(mail, error)
+        return 0
+
+    sent = 0
+    interval = 1 / get_setting("RATE")
+    next_send = time.monotonic()
+    try:
+        for mail in mails:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send = max(next_send, time.monotonic()) + interval
+            try:
+                message = pickle.loads(bytes(mail.message))
+                mailer.send_messages([message])
+            except Exception:
+                failed(mail, traceback.format_exc())
+                continue
+            mail.status = OutgoingMail.SENT
+            mail.sent_at = timezone.now()
+            mail.locked_at = None
+            # the message is not needed anymore once delivered
+            mail.message = b""
+            mail.save(update_fields=["status", "sent_at", "locked_at", "message"])
+            sent += 1
+    finally:
+        mailer.close()
+    return sent
+
+
+def work(burst=False):
+    """Deliver the mails of the outbox until stopped
+
+    Args:
+        burst (bool): Return once the outbox is empty instead of polling
+    """
+
+    while True:
+        close_old_connections()
+        mails = claim(get_setting("BATCH_SIZE"))
+        if mails:
+            deliver(mails)
+            continue
+        if burst:
+            return
+        time.sleep(get_setting("POLL_INTERVAL"))
@@ -0,0 +1,72 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from quiz_app.excel import generate_result_as_excel
+
+
+def fake_result(questions):
+    """Build an unsaved user, quiz, quiz taker and responses for the benchmark"""
+
+    now = timezone.now()
+    user = SimpleNamespace(
+        full_name="Benchmark User", email="bench@example.com", timeZone="Asia/Kolkata"
+    )
+    quiz = SimpleNamespace(title="Benchmark", description="Line 1\nLine 2\nLine 3")
+    quizTaker = SimpleNamespace(
+        extra=json.dumps({"Roll No": "2021A7PS0001", "Section": "A"}),
+        started=now - timedelta(minutes=90),
+        ended_at=now,
+    )
+    responses = []
+    for i in range(questions):
+        question = SimpleNamespace(
+            title=f"Question statement number {i} " * 4,
+            choice_1="Option A",
+            choice_2="Option B",
+            choice_3="Option C",
+            choice_4="Option D",
+            choice_5=None,
+            correct="Option A",
+            marks=1 + i % 3,
+        )
+        answer = ("Option A", "Option B", "")[i % 3]
+        isCorrect = answer == question.correct
+        responses.append(
+            SimpleNamespace(
+                question=question,
+                answer=answer,
+                isCorrect=isCorrect,
+                marks=question.marks if isCorrect else 0,
+            )
+        )
+    return user, quiz, quizTaker, responses
+
+
+class Command(BaseCommand):
+    help = "Measure the time taken by generate_result_as_excel per result"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--questions", type=int, nargs="+", default=[10, 100, 1000],
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        for questions in options["questions"]:
+            args = fake_result(questions)
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                generate_result_as_excel(*args)
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"{questions:5} questions: "
+                f"median {statistics.median(timings) * 1000:8.2f} ms, "
+                f"min {min(timings) * 1000:8.2f} ms per result"
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_app.query_plans import check_hot_queries
+
+
+class Command(BaseCommand):
+    help = "Explain the hot queries and flag the full scans and filesorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--plans", action="store_true", help="Show the plan of every query"
+        )
+
+    def handle(self, *args, **options):
+        flagged = []
+        for name, plan, problems, accepted in check_hot_queries():
+            if problems:
+                flagged.append(name)
+                status = self.style.ERROR(", ".join(sorted(problems)))
+            elif accepted:
+                status = f"ok (accepted {', '.join(sorted(accepted))})"
+            else:
+                status = self.style.SUCCESS("ok")
+            self.stdout.write(f"{name}: {status}")
+            if problems or options["plans"]:
+                self.stdout.write(f"    {plan}".replace("\n", "\n    "))
+
+        if flagged:
+            raise CommandError(f"{len(flagged)} hot queries need an index")
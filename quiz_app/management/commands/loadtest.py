@@ -0,0 +1,281 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz_app.models import Account, Job, Question, Quiz, QuizTakers
+
+PASSWORD = "loadtest-password"
+EMAIL = "loadtest-{}@example.com"
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(timings, p) -> float:
+    """Nearest rank percentile of sorted timings"""
+
+    return timings[max(math.ceil(p * len(timings) / 100), 1) - 1]
+
+
+def seed(takers, questions):
+    """Create a running quiz with the given number of quiz takers
+
+    Returns:
+        tuple: (quiz, question ids)
+    """
+
+    invigilator, _ = Account.objects.get_or_create(
+        email=EMAIL.format("staff"),
+        defaults=dict(full_name="Load Test", is_active=True, is_staff=True),
+    )
+    now = timezone.now()
+    quiz = Quiz.objects.create(
+        title="Load Test",
+        invigilator=invigilator,
+        start_date=now - timedelta(minutes=1),
+        end_date=now + timedelta(hours=1),
+        duration=60,
+        extra="Roll No",
+    )
+    Question.objects.bulk_create(
+        Question(
+            quiz=quiz,
+            title=f"Question {i}",
+            choice_1="A",
+            choice_2="B",
+            choice_3="C",
+            choice_4="D",
+            correct="A",
+            marks=1,
+        )
+        for i in range(questions)
+    )
+    # one hash for all the accounts, hashing is slow on purpose
+    password = make_password(PASSWORD)
+    Account.objects.bulk_create(
+        (
+            Account(
+                email=EMAIL.format(i),
+                full_name=f"Candidate {i}",
+                password=password,
+                is_active=True,
+            )
+            for i in range(takers)
+        ),
+        ignore_conflicts=True,
+    )
+    users = Account.objects.filter(email__in=[EMAIL.format(i) for i in range(takers)])
+    QuizTakers.objects.bulk_create(QuizTakers(quiz=quiz, user=user) for user in users)
+    return quiz, list(quiz.question_set.values_list("pk", flat=True))
+
+
+class Session:
+    """A virtual candidate taking the quiz through the views"""
+
+    def __init__(self, number, quiz, question_ids, record, batch=1):
+        self.number = number
+        self.quiz = quiz
+        self.question_ids = question_ids
+        self.record = record
+        self.batch = batch
+        # server errors are counted like the other failed responses
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, name, method, path, data=None, expected=(200, 302)):
+        """Send a request and record its latency, outcome and query count
+
+        Returns:
+            bool: whether the response had one of the expected status codes
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                response = getattr(self.client, method)(path, data or {})
+                error = None
+                if response.status_code not in expected:
+                    error = str(response.status_code)
+            except Exception as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+        self.record(name, elapsed, error, len(queries))
+        return error is None
+
+    def run(self) -> bool:
+        """Take the quiz, a session stops at the first failed step
+
+        Returns:
+            bool: whether the quiz was submitted
+        """
+
+        close_old_connections()
+        try:
+            return self.take_quiz()
+        finally:
+            close_old_connections()
+
+    def take_quiz(self) -> bool:
+        quiz_id = self.quiz.pk
+        # home logs the candidate in and resolves the key in a single POST
+        if not self.request(
+            "home",
+            "post",
+            reverse("home"),
+            {
+                "email": EMAIL.format(self.number),
+                "password": PASSWORD,
+                "key": self.quiz.key,
+            },
+            expected=(302,),
+        ):
+            return False
+        if not self.request(
+            "quiz_instructions", "get", reverse("quiz_instructions", args=[quiz_id])
+        ):
+            return False
+        if not self.request(
+            "save_extra",
+            "post",
+            reverse("save_extra"),
+            {"quiz": quiz_id, "extra": json.dumps({"Roll No": str(self.number)})},
+        ):
+            return False
+        if not self.request("quiz", "get", reverse("quiz", args=[quiz_id])):
+            return False
+        quizTaker = QuizTakers.objects.get(
+            quiz_id=quiz_id, user__email=EMAIL.format(self.number)
+        )
+        # the quiz page sends the pending answers in one batch, 2 seconds
+        # after the last answer, or before the quiz is submitted
+        answers = [
+            {"question": question_id, "answer": random.choice("ABCD"), "seq": seq}
+            for seq, question_id in enumerate(self.question_ids, 1)
+        ]
+        for start in range(0, len(answers), self.batch):
+            self.request(
+                "save_responses",
+                "post",
+                reverse("save_responses"),
+                {
+                    "quizTaker": quizTaker.pk,
+                    "responses": json.dumps(answers[start : start + self.batch]),
+                },
+            )
+        return self.request(
+            "completed", "post", reverse("completed"), {"quizTaker": quizTaker.pk}
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the sessions of concurrent candidates against a seeded quiz and "
+        "report the latency, throughput, errors and queries per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--takers", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--questions", type=int, default=20)
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=1,
+            help="Answers per batch, a candidate answering within 2 seconds "
+            "sends several answers at once (default: 1)",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded quiz and accounts"
+        )
+        parser.add_argument(
+            "--yes-i-mean-it",
+            action="store_true",
+            help="Run against the configured database although DATABASE_URL is "
+            "not set",
+        )
+
+    def handle(self, *args, **options):
+        # the seeded accounts and quiz are written to, then deleted from, the
+        # default database, which is the production one unless overridden
+        if not os.environ.get("DATABASE_URL") and not options["yes_i_mean_it"]:
+            raise CommandError(
+                "Set DATABASE_URL to a scratch database, or pass --yes-i-mean-it "
+                "to load test the configured database"
+            )
+        takers = options["takers"]
+        batch = max(options["batch"], 1)
+        quiz, question_ids = seed(takers, options["questions"])
+        last_job = Job.objects.order_by("-pk").values_list("pk", flat=True).first()
+
+        results = defaultdict(list)
+        lock = threading.Lock()
+
+        def record(name, elapsed, error, queries):
+            with lock:
+                results[name].append((elapsed, error, queries))
+
+        # allows the test client host and keeps the mails in memory
+        setup_test_environment()
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                sessions = [
+                    Session(number, quiz, question_ids, record, batch)
+                    for number in range(takers)
+                ]
+                submitted = sum(executor.map(Session.run, sessions))
+            elapsed = time.perf_counter() - started
+        finally:
+            teardown_test_environment()
+            if not options["keep"]:
+                Job.objects.filter(
+                    pk__gt=last_job or 0, name="submission_finished"
+                ).delete()
+                quiz.delete()
+                Account.objects.filter(email__startswith="loadtest-").delete()
+
+        self.report(results, elapsed)
+        self.stdout.write(f"{submitted} of {takers} quizzes submitted")
+
+    def report(self, results, elapsed):
+        header = f"{'endpoint':18} {'requests':>8} {'errors':>7}"
+        for p in PERCENTILES:
+            header += f" {'p' + str(p) + ' ms':>9}"
+        self.stdout.write(header + f" {'queries':>8}")
+
+        requests = errors = 0
+        causes = Counter()
+        for name, samples in results.items():
+            timings = sorted(elapsed for elapsed, _, _ in samples)
+            failed = sum(error is not None for _, error, _ in samples)
+            causes.update(f"{name} {error}" for _, error, _ in samples if error)
+            queries = sum(count for _, _, count in samples) / len(samples)
+            requests += len(samples)
+            errors += failed
+            line = f"{name:18} {len(samples):8} {failed:7}"
+            for p in PERCENTILES:
+                line += f" {percentile(timings, p) * 1000:9.1f}"
+            self.stdout.write(line + f" {queries:8.1f}")
+
+        self.stdout.write(
+            f"{requests} requests in {elapsed:.1f} s, "
+            f"{requests / elapsed:.1f} requests/s, "
+            f"error rate {100 * errors / max(requests, 1):.2f}%"
+        )
+        for cause, count in causes.most_common():
+            self.stdout.write(f"  {count:6} x {cause}")
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from quiz_app.models import Question, Quiz, QuizTakers, Response
+
+
+def summary_subquery(aggregate, queryset, group_by):
+    """Aggregate the rows of queryset, which is filtered on an outer reference"""
+
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(value=aggregate)
+            .values("value")[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Recompute the summary columns of the quiz takers from their responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quiz", help="Only rebuild the quiz takers of the quiz with this id"
+        )
+
+    def handle(self, *args, **options):
+        responses = Response.objects.filter(quiztaker=OuterRef("pk"))
+        questions = Question.objects.filter(quiz=OuterRef("quiz"))
+        quizzes = Quiz.objects.all()
+        if options["quiz"]:
+            quizzes = quizzes.filter(pk=options["quiz"])
+
+        # one set based UPDATE per quiz keeps the locks short
+        for quiz_id in quizzes.values_list("pk", flat=True).iterator():
+            updated = QuizTakers.objects.filter(quiz_id=quiz_id).update(
+                answered_count=summary_subquery(
+                    Count("pk", filter=~Q(answer="") & Q(answer__isnull=False)),
+                    responses,
+                    "quiztaker",
+                ),
+                correct_count=summary_subquery(
+                    Count("pk", filter=Q(isCorrect=True)), responses, "quiztaker"
+                ),
+                marks_obtained=summary_subquery(Sum("marks"), responses, "quiztaker"),
+                total_marks=summary_subquery(Sum("marks"), questions, "quiz"),
+            )
+            self.stdout.write(f"Quiz {quiz_id}: {updated} quiz takers rebuilt")
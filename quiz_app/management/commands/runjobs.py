@@ -0,0 +1,46 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from quiz_app import jobs
+
+
+class Command(BaseCommand):
+    help = "Start the workers which process the background job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=jobs.get_setting("CONCURRENCY"),
+            help="Number of worker processes (default: JOB_QUEUE['CONCURRENCY'])",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(options["concurrency"], 1)
+        burst = options["burst"]
+        self.stdout.write(f"Starting {concurrency} job worker(s)")
+        if concurrency == 1:
+            jobs.work(burst=burst)
+            return
+
+        # the forked workers must not share the connection of the parent
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=jobs.work, kwargs={"burst": burst})
+            for _ in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app import mail
+
+
+class Command(BaseCommand):
+    help = "Start the sender which delivers the mails of the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the outbox is empty instead of polling for new mails",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Delivering mails with {mail.get_setting('BACKEND')}")
+        mail.work(burst=options["burst"])
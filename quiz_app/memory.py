@@ -0,0 +1,64 @@
+import os
+import threading
+
+INTERVAL = 0.05
+
+
+def current_rss():
+    """The resident memory of this process in bytes, read from /proc
+
+    Returns:
+        int: the resident set size, or None where /proc is not available
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRSS:
+    """Sample the resident memory of the process while a block runs
+
+    A thread reads the RSS every INTERVAL seconds, nothing is traced so the
+    block runs at full speed. Unlike ru_maxrss the peak is that of the block,
+    not of the whole life of the process.
+
+    Usage::
+
+        with PeakRSS() as rss:
+            ...
+        rss.before, rss.peak
+    """
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.before = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.before = current_rss()
+        self.peak = self.before
+        if self.before is not None:
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self.sample()
@@ -0,0 +1,399 @@
+import atexit
+import contextvars
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+from django.template.backends.django import Template as BaseTemplate
+
+from .cache import tiered_stats
+
+DEFAULTS = {
+    "DIR": os.path.join(tempfile.gettempdir(), "quiz_metrics"),
+    "FLUSH_INTERVAL": 1,
+    "TOKEN": None,
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNTERS = {
+    "quiz_http_requests_total": "Requests handled, by view, method and status",
+    "quiz_db_queries_total": "Database queries run while handling requests",
+    "quiz_db_query_seconds_total": "Time spent in database queries",
+    "quiz_template_render_seconds_total": "Time spent rendering templates",
+    "quiz_cache_requests_total": "Reads of the tiered caches, by tier and result",
+}
+HISTOGRAMS = {
+    "quiz_http_request_duration_seconds": "Time taken to handle a request",
+}
+
+
+def get_setting(name):
+    """Read a value of the METRICS setting, falling back to the defaults"""
+
+    return getattr(settings, "METRICS", {}).get(name, DEFAULTS[name])
+
+
+class Registry:
+    """Metrics of this process, written to a file of its own in the metrics
+    directory so that every worker process is included in the scrape
+
+    The file is named by the pid and the start time of the process, so a
+    new process reusing the pid of an exited one doesn't overwrite its file.
+    The files of exited processes are merged into the archive on collect,
+    the counters only go up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._flushed = 0
+        self._pid = None
+        self._filename = None
+
+    @property
+    def filename(self) -> str:
+        # set on the first flush, in the worker process after any fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._filename = f"{self._pid}-{time.time_ns()}.json"
+        return self._filename
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                # the count of each bucket, then the sum and the count
+                histogram = [0] * (len(BUCKETS) + 2)
+                self._histograms[name, labels] = histogram
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self) -> dict:
+        # the tiered caches count their reads themselves
+        cache_counters = [
+            ["quiz_cache_requests_total", [alias, tier, result], value]
+            for alias, tiers in tiered_stats().items()
+            for tier, counts in tiers.items()
+            for result, value in counts.items()
+            if result != "entries"
+        ]
+        with self._lock:
+            return {
+                "counters": cache_counters
+                + [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), list(histogram)]
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """Write the metrics to the file of this process, at most once per
+        FLUSH_INTERVAL seconds unless forced"""
+
+        now = time.monotonic()
+        if not force and now - self._flushed < get_setting("FLUSH_INTERVAL"):
+            return
+        if not self._counters and not self._histograms:
+            # e.g. a management command, which handles no requests
+            return
+        self._flushed = now
+        directory = get_setting("DIR")
+        os.makedirs(directory, exist_ok=True)
+        write(os.path.join(directory, self.filename), self.snapshot())
+
+
+def write(path, data):
+    """Replace a metrics file at once, a scrape never reads it half written"""
+
+    with tempfile.NamedTemporaryFile(
+        "w", dir=os.path.dirname(path), suffix=".tmp", delete=False
+    ) as f:
+        json.dump(data, f)
+    os.replace(f.name, path)
+
+
+registry = Registry()
+# the requests handled since the last flush are not lost when a worker exits
+atexit.register(registry.flush, force=True)
+
+# The statistics of the request being handled, a context variable so that
+# the concurrent requests of the worker threads are counted apart
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "template_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Time the queries of every new database connection"""
+
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        stats = current_request.get()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """The django template backend, timing the rendering of the templates"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
+
+
+class MetricsMiddleware:
+    """Record the count, latency, queries and template time of each request
+    by the name of the resolved URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.url_name or "unnamed") if match else "unresolved"
+        registry.inc(
+            "quiz_http_requests_total",
+            (view, request.method, str(response.status_code)),
+        )
+        registry.observe("quiz_http_request_duration_seconds", (view,), elapsed)
+        if stats.queries:
+            registry.inc("quiz_db_queries_total", (view,), stats.queries)
+            registry.inc("quiz_db_query_seconds_total", (view,), stats.query_time)
+        if stats.template_time:
+            registry.inc(
+                "quiz_template_render_seconds_total", (view,), stats.template_time
+            )
+        registry.flush()
+        return response
+
+
+LABELS = {
+    "quiz_http_requests_total": ("view", "method", "status"),
+    "quiz_cache_requests_total": ("cache", "tier", "result"),
+}
+
+
+ARCHIVE = "archive.json"
+
+
+def is_running(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running as another user
+        pass
+    return True
+
+
+def merge(counters, histograms, data):
+    for name, labels, value in data["counters"]:
+        counters[name, tuple(labels)] += value
+    for name, labels, histogram in data["histograms"]:
+        total = histograms.setdefault((name, tuple(labels)), [0] * len(histogram))
+        for i, value in enumerate(histogram):
+            total[i] += value
+
+
+def read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def archive(directory):
+    """Merge the files of the processes that exited into the archive
+
+    Like the multiprocess mode of prometheus_client, but done by the scrape:
+    the processes are checked by their pid, which is only possible on Unix,
+    and the archive is rewritten under a file lock so that concurrent scrapes
+    don't both merge the same files.
+    """
+
+    if fcntl is None:
+        # os.kill would terminate the process, the files are just kept
+        return
+    with open(os.path.join(directory, "archive.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for filename in os.listdir(directory):
+            pid = filename.split("-", 1)[0].split(".", 1)[0]
+            if (
+                filename.endswith(".json")
+                and pid.isdigit()
+                and int(pid) != os.getpid()
+                and not is_running(int(pid))
+            ):
+                dead.append(filename)
+        if not dead:
+            return
+
+        counters = defaultdict(float)
+        histograms = {}
+        path = os.path.join(directory, ARCHIVE)
+        for data in map(read, [path] + [os.path.join(directory, f) for f in dead]):
+            if data:
+                merge(counters, histograms, data)
+        write(
+            path,
+            {
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in counters.items()
+                ],
+                "histograms": [
+                    [name, list(labels), histogram]
+                    for (name, labels), histogram in histograms.items()
+                ],
+            },
+        )
+        for filename in dead:
+            os.remove(os.path.join(directory, filename))
+
+
+def collect() -> tuple:
+    """Sum the metrics written by every process and the archive of the ones
+    that exited
+
+    Returns:
+        tuple: (counters, histograms) keyed by (name, labels)
+    """
+
+    counters = defaultdict(float)
+    histograms = {}
+    directory = get_setting("DIR")
+    if not os.path.isdir(directory):
+        return counters, histograms
+    archive(directory)
+    for filename in os.listdir(directory):
+        if filename.endswith(".json"):
+            data = read(os.path.join(directory, filename))
+            if data:
+                merge(counters, histograms, data)
+    return counters, histograms
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_labels(name, labels, **extra) -> str:
+    pairs = list(zip(LABELS.get(name, ("view",)), labels)) + list(extra.items())
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+
+def render() -> str:
+    """The metrics of all the processes in the Prometheus text format"""
+
+    counters, histograms = collect()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{format_labels(name, labels)} {value:g}")
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{format_labels(name, labels, le=bound)} {cumulative}"
+                )
+            lines.append(
+                f"{name}_bucket{format_labels(name, labels, le='+Inf')} {histogram[-1]}"
+            )
+            lines.append(f"{name}_sum{format_labels(name, labels)} {histogram[-2]:g}")
+            lines.append(f"{name}_count{format_labels(name, labels)} {histogram[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics(request):
+    """Serve the metrics to the bearer of METRICS TOKEN, or to staff users"""
+
+    token = get_setting("TOKEN")
+    if token:
+        allowed = hmac.compare_digest(
+            request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+        )
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse(status=403)
+    registry.flush(force=True)
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
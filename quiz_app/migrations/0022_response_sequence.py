@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-17 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0021_quiz_invigilator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='sequence',
+            field=models.IntegerField(default=0),
+        ),
+    ]
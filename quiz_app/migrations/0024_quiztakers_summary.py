@@ -0,0 +1,77 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:01
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def summary_subquery(aggregate, queryset, group_by):
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(value=aggregate)
+            .values("value")[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_summaries(apps, schema_editor):
+    """Compute the new columns of the existing attempts
+
+    The same per quiz UPDATE as the rebuild_attempt_summaries command, which
+    can't be imported here as it uses the current models.
+    """
+
+    Question = apps.get_model("quiz_app", "Question")
+    Quiz = apps.get_model("quiz_app", "Quiz")
+    QuizTakers = apps.get_model("quiz_app", "QuizTakers")
+    Response = apps.get_model("quiz_app", "Response")
+    responses = Response.objects.filter(quiztaker=OuterRef("pk"))
+    questions = Question.objects.filter(quiz=OuterRef("quiz"))
+    for quiz_id in Quiz.objects.values_list("pk", flat=True).iterator():
+        QuizTakers.objects.filter(quiz_id=quiz_id).update(
+            answered_count=summary_subquery(
+                Count("pk", filter=~Q(answer="") & Q(answer__isnull=False)),
+                responses,
+                "quiztaker",
+            ),
+            correct_count=summary_subquery(
+                Count("pk", filter=Q(isCorrect=True)), responses, "quiztaker"
+            ),
+            marks_obtained=summary_subquery(Sum("marks"), responses, "quiztaker"),
+            total_marks=summary_subquery(Sum("marks"), questions, "quiz"),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0023_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiztakers',
+            name='answered_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiztakers',
+            name='correct_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiztakers',
+            name='marks_obtained',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiztakers',
+            name='total_marks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
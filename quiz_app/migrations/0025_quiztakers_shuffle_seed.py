@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0024_quiztakers_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiztakers',
+            name='shuffle_seed',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0025_quiztakers_shuffle_seed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['quiz', 'marks', 'created_at'], name='question_quiz_order'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['start_date'], name='quiz_start_date'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['end_date'], name='quiz_end_date'),
+        ),
+        migrations.AddIndex(
+            model_name='quiztakers',
+            index=models.Index(fields=['completed', 'started'], name='quiztaker_open'),
+        ),
+        migrations.AddIndex(
+            model_name='quiztakers',
+            index=models.Index(fields=['quiz', 'marks_obtained'], name='quiztaker_quiz_marks'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:18
+
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def hash_question_bank(apps, schema_editor):
+    """Fill the content hash of the existing questions, as Question_bank.save does"""
+
+    Question_bank = apps.get_model("quiz_app", "Question_bank")
+    fields = ["title", "choice_1", "choice_2", "choice_3", "choice_4", "choice_5"]
+    batch = []
+    for question in Question_bank.objects.only(*fields).iterator():
+        parts = [str(getattr(question, field) or "").strip() for field in fields]
+        question.content_hash = hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+        batch.append(question)
+        if len(batch) == 1000:
+            Question_bank.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    Question_bank.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0026_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question_bank',
+            name='content_hash',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(hash_question_bank, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='QuestionBankImport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('file', models.BinaryField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_rows', models.IntegerField(blank=True, null=True)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('created_count', models.IntegerField(default=0)),
+                ('duplicate_count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('errors', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'question bank imports',
+                'db_table': 'question_bank_import',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
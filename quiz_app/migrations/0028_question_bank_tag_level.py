@@ -0,0 +1,17 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0027_question_bank_import'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question_bank',
+            index=models.Index(fields=['tag', 'level'], name='question_bank_tag_level'),
+        ),
+    ]
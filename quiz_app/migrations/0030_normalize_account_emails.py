@@ -0,0 +1,45 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:25
+
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def normalize_emails(apps, schema_editor):
+    """Lowercase the stored emails, as Account.save does
+
+    Accounts only differing by the case of their email can't all keep it, and
+    the ones left mixed case could not log in anymore. The migration fails
+    listing them, to be merged or removed by an admin before migrating again.
+    """
+
+    Account = apps.get_model("quiz_app", "Account")
+    accounts = defaultdict(list)
+    for pk, email in Account.objects.values_list("pk", "email").iterator():
+        accounts[email.strip().lower()].append((pk, email))
+
+    conflicts = [group for group in accounts.values() if len(group) > 1]
+    if conflicts:
+        raise RuntimeError(
+            "Accounts whose emails only differ by case, merge or remove them "
+            "before migrating:\n"
+            + "\n".join(
+                ", ".join(f"{pk} <{email}>" for pk, email in group)
+                for group in conflicts
+            )
+        )
+
+    for normalized, [(pk, email)] in accounts.items():
+        if email != normalized:
+            Account.objects.filter(pk=pk).update(email=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0029_mail_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0030_normalize_account_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiztakers',
+            name='entry_nonce',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
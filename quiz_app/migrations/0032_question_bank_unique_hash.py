@@ -0,0 +1,40 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Keep the first of the questions with the same statement and choices
+
+    They were added before the bank checked for duplicates, the questions of
+    the quizzes are copies so no quiz is changed.
+    """
+
+    Question_bank = apps.get_model("quiz_app", "Question_bank")
+    duplicates = (
+        Question_bank.objects.order_by()
+        .values("content_hash")
+        .annotate(first=Min("pk"), count=Count("pk"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        Question_bank.objects.filter(content_hash=duplicate["content_hash"]).exclude(
+            pk=duplicate["first"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0031_quiztaker_entry_nonce'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='question_bank',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.6 on 2026-10-17 18:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0032_question_bank_unique_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizExport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('takers', models.IntegerField(default=0)),
+                ('responses', models.IntegerField(default=0)),
+                ('seconds', models.FloatField(default=0)),
+                ('rss_before', models.BigIntegerField(blank=True, null=True)),
+                ('peak_rss', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exported_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz_app.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'quiz exports',
+                'db_table': 'quiz_export',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+import hashlib
 import random
 import string
 from datetime import datetime, timedelta
@@ -6,10 +7,10 @@ from uuid import uuid4
 
 import pytz
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.core.exceptions import ValidationError
 from django.core.mail import BadHeaderError, send_mail
 from django.core.validators import MinLengthValidator
 from django.db import models
-from django.db.models.aggregates import Sum
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.html import strip_tags
@@ -19,6 +20,13 @@ from verify_email.email_handler import _VerifyEmail
 class AccountManager(BaseUserManager):
     """Account manager for custom user models."""
 
+    @classmethod
+    def normalize_email(cls, email):
+        """Lowercase the whole email, the emails are stored lowercased so that
+        they are looked up exactly on the unique index"""
+
+        return (email or "").strip().lower()
+
     def create_user(self, email, full_name, password=None):
         """Overriding the default create_user method
 
@@ -97,6 +105,15 @@ class Account(AbstractBaseUser):
     def __str__(self):
         return f"{self.full_name}\t\t{self.email}"
 
+    @classmethod
+    def normalize_username(cls, username):
+        # used by clean, so the forms check the uniqueness of the stored email
+        return AccountManager.normalize_email(super().normalize_username(username))
+
+    def save(self, *args, **kwargs):
+        self.email = AccountManager.normalize_email(self.email)
+        return super(Account, self).save(*args, **kwargs)
+
     def has_perm(self, perm, obj=None):
         return self.is_admin
 
@@ -208,6 +225,10 @@ class Quiz(models.Model):
         db_table = "quiz"
         app_label = "quiz_app"
         verbose_name_plural = "Quizzes"
+        indexes = [
+            models.Index(fields=["start_date"], name="quiz_start_date"),
+            models.Index(fields=["end_date"], name="quiz_end_date"),
+        ]
         ordering = [
             "created_at",
         ]
@@ -254,6 +275,41 @@ class Question_bank(models.Model):
     isShuffle = models.BooleanField(default=True)
     level = models.CharField(max_length=15, choices=LEVELS, default=BEGINNER)
     created_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(
+        max_length=64, unique=True, default="", editable=False
+    )
+
+    @staticmethod
+    def compute_hash(title, *choices) -> str:
+        """Hash of the statement and the choices, used to find duplicates
+
+        Args:
+            title (str): The question statement
+            *choices (str): The choices, None for the empty ones
+        """
+
+        parts = [str(part or "").strip() for part in (title, *choices)]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get_content_hash(self) -> str:
+        return Question_bank.compute_hash(
+            self.title,
+            self.choice_1,
+            self.choice_2,
+            self.choice_3,
+            self.choice_4,
+            self.choice_5,
+        )
+
+    def clean(self):
+        # the hash is not a field of the forms, so the uniqueness is checked here
+        duplicates = Question_bank.objects.filter(content_hash=self.get_content_hash())
+        if duplicates.exclude(pk=self.pk).exists():
+            raise ValidationError("This question is already in the question bank")
+
+    def save(self, *args, **kwargs):
+        self.content_hash = self.get_content_hash()
+        return super(Question_bank, self).save(*args, **kwargs)
 
     class Meta:
         db_table = "question_bank"
@@ -264,6 +320,9 @@ class Question_bank(models.Model):
             "tag",
             "level",
         ]
+        indexes = [
+            models.Index(fields=["tag", "level"], name="question_bank_tag_level"),
+        ]
 
 
 class Question(models.Model):
@@ -285,6 +344,12 @@ class Question(models.Model):
         db_table = "question"
         app_label = "quiz_app"
         verbose_name_plural = "questions"
+        indexes = [
+            # the questions of a quiz in the default order
+            models.Index(
+                fields=["quiz", "marks", "created_at"], name="question_quiz_order"
+            ),
+        ]
         ordering = [
             "marks",
             "created_at",
@@ -294,15 +359,120 @@ class Question(models.Model):
         return f"Question id: {self.pk}"
 
 
+class QuizTakersQuerySet(models.QuerySet):
+    """QuerySet of the quiz takers which computes the attempt state in the db."""
+
+    def with_deadline(self):
+        """Annotate the time at which the attempt runs out as deadline"""
+
+        # DurationFields are stored as microseconds by MySQL and SQLite
+        duration = models.ExpressionWrapper(
+            models.F("quiz__duration") * 60 * 1000000,
+            output_field=models.DurationField(),
+        )
+        return self.annotate(
+            deadline=models.ExpressionWrapper(
+                models.F("started") + duration, output_field=models.DateTimeField()
+            )
+        )
+
+    def with_state(self, now=None):
+        """Annotate the state of the attempt as seen by the quiz taker
+
+        The state is the same as the one given by the was_missed and has_ended
+        properties and quiz.has_started, without touching the rows.
+        """
+
+        now = now or timezone.now()
+        return self.with_deadline().annotate(
+            state=models.Case(
+                models.When(
+                    completed__isnull=False, then=models.Value(QuizTakers.ENDED)
+                ),
+                models.When(
+                    started__isnull=True,
+                    quiz__end_date__lt=now,
+                    then=models.Value(QuizTakers.MISSED),
+                ),
+                models.When(deadline__lte=now, then=models.Value(QuizTakers.ENDED)),
+                models.When(
+                    quiz__start_date__gte=now,
+                    then=models.Value(QuizTakers.UPCOMING),
+                ),
+                default=models.Value(QuizTakers.CURRENT),
+                output_field=models.CharField(),
+            )
+        )
+
+
 class QuizTakers(models.Model):
     """Model for the quiztakers table."""
 
+    MISSED = "missed"
+    ENDED = "ended"
+    CURRENT = "current"
+    UPCOMING = "upcoming"
+
+    objects = QuizTakersQuerySet.as_manager()
+
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     user = models.ForeignKey(Account, on_delete=models.CASCADE)
     extra = models.TextField(blank=True, null=True)
     started = models.DateTimeField(blank=True, null=True)
     completed = models.DateTimeField(blank=True, null=True)
     suspicion_count = models.IntegerField(default=0)
+    answered_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    marks_obtained = models.IntegerField(default=0)
+    total_marks = models.IntegerField(default=0)
+    shuffle_seed = models.IntegerField(blank=True, null=True)
+    # the nonce of the entry link of the quiz taker, cleared once it is used
+    entry_nonce = models.CharField(max_length=32, blank=True, default="")
+
+    def add_to_summary(self, answered=0, correct=0, marks=0):
+        """Apply the change of a saved answer to the summary columns
+
+        The columns are updated with F expressions so that the concurrent
+        saves of the same attempt don't overwrite each other.
+        """
+
+        if answered or correct or marks:
+            QuizTakers.objects.filter(pk=self.pk).update(
+                answered_count=models.F("answered_count") + answered,
+                correct_count=models.F("correct_count") + correct,
+                marks_obtained=models.F("marks_obtained") + marks,
+            )
+
+    def question_order(self, question_ids) -> list:
+        """Order the questions of the attempt with the shuffle seed
+
+        Args:
+            question_ids (iterable): The ids of the questions of the quiz
+
+        Returns:
+            list: the question ids in the order shown to the quiz taker
+        """
+
+        order = sorted(question_ids)
+        random.Random(self.shuffle_seed).shuffle(order)
+        return order
+
+    def responses_with_unanswered(self) -> list:
+        """The responses ordered by question, including the unanswered ones
+
+        Response rows are only created when a question is answered, a blank
+        unsaved response is returned for every other question of the quiz.
+        """
+
+        answered = {r.question_id: r for r in self.response_set.order_by()}
+        responses = []
+        for question in self.quiz.question_set.order_by("pk"):
+            response = answered.get(question.pk)
+            if response is None:
+                response = Response(quiztaker=self, answer="")
+            response.question = question
+            responses.append(response)
+        return responses
 
     @property
     def time_remaining(self):
@@ -312,21 +482,26 @@ class QuizTakers(models.Model):
 
     @property
     def has_ended(self) -> bool:
+        # expired attempts are closed by the close_expired_attempts command
         if self.completed:
             return True
         if not self.started:
             return False
-        time = self.started + timedelta(minutes=self.quiz.duration) - timezone.now()
-        if time.total_seconds() <= 0:
-            self.completed = self.started + timedelta(minutes=self.quiz.duration)
-            self.save()
-        return time.total_seconds() <= 0
+        return self.time_remaining <= 0
+
+    @property
+    def ended_at(self):
+        """The submission time, or the end of the time limit if not closed yet"""
+
+        if self.completed or not self.started:
+            return self.completed
+        return self.started + timedelta(minutes=self.quiz.duration)
 
     @property
     def has_passed(self) -> bool:
-        total_marks = self.quiz.question_set.aggregate(Sum("marks"))["marks__sum"] or 0
-        marks_obtained = self.response_set.aggregate(Sum("marks"))["marks__sum"] or 0
-        if 100 * marks_obtained / total_marks > 33:
+        if not self.total_marks:
+            return False
+        if 100 * self.marks_obtained / self.total_marks > 33:
             return True
         return False
 
@@ -343,6 +518,12 @@ class QuizTakers(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["quiz", "user"], name="Unique Quiz Taker"),
         ]
+        indexes = [
+            # the open attempts closed by the sweeper
+            models.Index(fields=["completed", "started"], name="quiztaker_open"),
+            # covers the score statistics of a quiz
+            models.Index(fields=["quiz", "marks_obtained"], name="quiztaker_quiz_marks"),
+        ]
         ordering = [
             "quiz",
             "user",
@@ -357,6 +538,24 @@ class Response(models.Model):
     answer = models.TextField(blank=True, null=True)
     isCorrect = models.BooleanField(default=False)
     marks = models.IntegerField(default=0)
+    sequence = models.IntegerField(default=0)
+
+    def set_answer(self, answer, isCorrect, marks):
+        """Set the answer and return the change of the attempt summary
+
+        Returns:
+            tuple: the change of the answered count, correct count and marks
+        """
+
+        before = (bool(self.answer), int(self.isCorrect), self.marks)
+        self.answer = answer
+        self.isCorrect = isCorrect
+        self.marks = marks
+        return (
+            bool(self.answer) - before[0],
+            int(self.isCorrect) - before[1],
+            self.marks - before[2],
+        )
 
     class Meta:
         db_table = "response"
@@ -371,3 +570,161 @@ class Response(models.Model):
             "quiztaker",
             "question",
         ]
+
+
+class Job(models.Model):
+    """Model for the job table, a persistent queue of background tasks."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=50)
+    payload = models.TextField(default="{}")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    class Meta:
+        db_table = "job"
+        app_label = "quiz_app"
+        verbose_name_plural = "jobs"
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_status_run_at"),
+        ]
+        ordering = [
+            "run_at",
+        ]
+
+
+class QuestionBankImport(models.Model):
+    """Model for the question_bank_import table, an uploaded question bank
+    imported by the job workers."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    filename = models.CharField(max_length=255)
+    file = models.BinaryField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    total_rows = models.IntegerField(blank=True, null=True)
+    processed_rows = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    duplicate_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.TextField(blank=True, default="")
+    uploaded_by = models.ForeignKey(
+        Account, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+    @property
+    def progress(self) -> str:
+        if not self.total_rows:
+            return f"{self.processed_rows} rows"
+        percent = 100 * self.processed_rows // self.total_rows
+        return f"{self.processed_rows} / {self.total_rows} rows ({percent}%)"
+
+    class Meta:
+        db_table = "question_bank_import"
+        app_label = "quiz_app"
+        verbose_name_plural = "question bank imports"
+        ordering = [
+            "-created_at",
+        ]
+
+
+class QuizExport(models.Model):
+    """Model for the quiz_export table, the time and memory taken by the
+    exports of the results of a quiz."""
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    exported_by = models.ForeignKey(
+        Account, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    takers = models.IntegerField(default=0)
+    responses = models.IntegerField(default=0)
+    seconds = models.FloatField(default=0)
+    # the resident memory of the process before and at the peak of the
+    # export in bytes, null where it can't be measured
+    rss_before = models.BigIntegerField(blank=True, null=True)
+    peak_rss = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quiz} ({self.created_at})"
+
+    class Meta:
+        db_table = "quiz_export"
+        app_label = "quiz_app"
+        verbose_name_plural = "quiz exports"
+        ordering = [
+            "-created_at",
+        ]
+
+
+class OutgoingMail(models.Model):
+    """Model for the mail_outbox table, the mails waiting to be delivered by
+    the sender process."""
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (DEAD, "Dead"),
+    ]
+
+    subject = models.CharField(max_length=255, blank=True, default="")
+    recipients = models.TextField()
+    # the pickled EmailMessage, with its attachments
+    message = models.BinaryField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipients} ({self.status})"
+
+    class Meta:
+        db_table = "mail_outbox"
+        app_label = "quiz_app"
+        verbose_name_plural = "outgoing mails"
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="mail_outbox_status_run_at"),
+        ]
+        ordering = [
+            "run_at",
+        ]
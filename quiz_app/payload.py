@@ -0,0 +1,95 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.forms.models import model_to_dict
+
+from .models import Question, Quiz
+
+PAYLOAD_TIMEOUT = 60 * 60
+
+
+def version_key(quiz_id) -> str:
+    return f"quiz_version:{quiz_id}"
+
+
+def payload_key(quiz_id, version) -> str:
+    return f"quiz_questions:{quiz_id}:{version}"
+
+
+def new_version() -> int:
+    # a version taken from the clock is never reused after the cached
+    # version is evicted, so stale payloads can't be picked up again
+    return time.time_ns()
+
+
+def get_version(quiz_id) -> int:
+    """The version of the content of a quiz, changed on every edit"""
+
+    version = cache.get(version_key(quiz_id))
+    if version is None:
+        cache.add(version_key(quiz_id), new_version(), None)
+        version = cache.get(version_key(quiz_id))
+    return version
+
+
+def bump_version(quiz_id):
+    """Change the content version so the cached payload is rebuilt
+
+    The other processes keep reading the previous version from the local
+    tier of the cache, and serving the previous payload, for up to its
+    LOCAL_TIMEOUT seconds.
+    """
+
+    cache.set(version_key(quiz_id), new_version(), None)
+
+
+def build_payload(quiz_id) -> dict:
+    """Serialize every question of the quiz, without the correct answer
+
+    Returns:
+        dict: question id -> the question as a JSON string
+    """
+
+    return {
+        question.pk: json.dumps(
+            model_to_dict(question, exclude=["correct"]), default=str
+        )
+        for question in Question.objects.filter(quiz_id=quiz_id)
+    }
+
+
+def get_payload(quiz_id) -> dict:
+    """Get the serialized questions of a quiz from the shared cache
+
+    Only one process builds a missing payload, the others wait for it on the
+    lock of the quiz row. cache.add can't be the lock, it is not atomic
+    across processes with the file based shared cache.
+    """
+
+    key = payload_key(quiz_id, get_version(quiz_id))
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    with transaction.atomic():
+        quiz = Quiz.objects.select_for_update().filter(pk=quiz_id).order_by()
+        list(quiz.values_list("pk"))
+        # built by the process holding the lock while this one waited
+        payload = cache.get(key)
+        if payload is None:
+            payload = build_payload(quiz_id)
+            cache.set(key, payload, PAYLOAD_TIMEOUT)
+    return payload
+
+
+def join(payload, order) -> str:
+    """Join the serialized questions into a JSON list in the given order
+
+    Args:
+        payload (dict): The serialized questions from get_payload
+        order (list): The question ids in the order of the attempt
+    """
+
+    return "[" + ", ".join(payload[question_id] for question_id in order) + "]"
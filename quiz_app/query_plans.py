@@ -0,0 +1,201 @@
+import json
+import re
+from uuid import uuid4
+
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import (
+    Account,
+    Job,
+    Question,
+    Question_bank,
+    Quiz,
+    QuizTakers,
+    Response,
+)
+
+SCAN = "full scan"
+FILESORT = "filesort"
+
+# name -> (function building the queryset, problems accepted for the query)
+HOT_QUERIES = {}
+
+# SQLite reports "SCAN table", or "SCAN table USING INDEX" for a full index
+# scan, and a temporary b-tree when it has to sort the rows itself
+SQLITE_SCAN = re.compile(r"\bSCAN\b")
+SQLITE_SORT = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)")
+
+
+def hot_query(name, allow=()):
+    """Register a function returning the queryset of a hot query
+
+    Args:
+        name (str): The name shown in the report
+        allow (tuple): The problems accepted for the query, e.g. sorting the
+            few rows of one user is cheaper than an index for the order
+    """
+
+    def register(func):
+        HOT_QUERIES[name] = (func, frozenset(allow))
+        return func
+
+    return register
+
+
+# the login of the authentication backend
+@hot_query("account of an email")
+def account_email():
+    return Account.objects.filter(email="candidate@example.com")
+
+
+# get() drops the default ordering
+@hot_query("quiz taker of a user")
+def quiz_taker():
+    return QuizTakers.objects.filter(quiz_id=uuid4(), user_id=1).order_by()
+
+
+# the attempts of one user are few, sorting them is cheaper than an index
+@hot_query("attempts of a user by start date", allow=[FILESORT])
+def profile_attempts():
+    return (
+        QuizTakers.objects.filter(user_id=1)
+        .select_related("quiz")
+        .order_by("quiz__start_date")
+    )
+
+
+@hot_query("open attempts to close")
+def open_attempts():
+    return QuizTakers.objects.filter(
+        started__isnull=False, completed__isnull=True
+    ).order_by()
+
+
+@hot_query("responses of an attempt")
+def attempt_responses():
+    return Response.objects.filter(quiztaker_id=1).order_by("pk")
+
+
+@hot_query("answered questions of an attempt")
+def attempt_answers():
+    return (
+        Response.objects.filter(quiztaker_id=1)
+        .order_by()
+        .values_list("question_id", "answer", "sequence")
+    )
+
+
+@hot_query("response to a question")
+def response_lookup():
+    return Response.objects.filter(quiztaker_id=1, question_id=1).order_by("pk")
+
+
+@hot_query("responses of a batch")
+def batch_responses():
+    return Response.objects.filter(quiztaker_id=1, question_id__in=[1, 2]).order_by()
+
+
+@hot_query("questions of a quiz")
+def quiz_questions():
+    return Question.objects.filter(quiz_id=uuid4())
+
+
+@hot_query("question bank ids of a tag and level")
+def blueprint_pool():
+    return (
+        Question_bank.objects.filter(tag="C", level="easy")
+        .order_by()
+        .values_list("pk", flat=True)
+    )
+
+
+@hot_query("answer key of a quiz")
+def answer_key():
+    return Question.objects.filter(quiz_id=uuid4()).values_list(
+        "pk", "correct", "marks"
+    )
+
+
+@hot_query("quiz of a key")
+def quiz_key():
+    return Quiz.objects.filter(key="ABCDEF").values_list(
+        "quiz_id", "start_date", "end_date"
+    )
+
+
+@hot_query("quizzes starting soon")
+def upcoming_quizzes():
+    return Quiz.objects.filter(start_date__gt=timezone.now()).order_by("start_date")
+
+
+@hot_query("quizzes ended")
+def ended_quizzes():
+    return Quiz.objects.filter(end_date__lt=timezone.now()).order_by("end_date")
+
+
+@hot_query("due jobs")
+def due_jobs():
+    return Job.objects.filter(status=Job.PENDING, run_at__lte=timezone.now()).order_by(
+        "run_at"
+    )
+
+
+@hot_query("score histogram of a quiz")
+def score_histogram():
+    return (
+        QuizTakers.objects.filter(quiz_id=uuid4())
+        .order_by()
+        .values_list("marks_obtained")
+        .annotate(number=Count("pk"))
+        .order_by("marks_obtained")
+    )
+
+
+def explain(queryset) -> str:
+    """The query plan of a queryset as given by the database"""
+
+    if connection.vendor == "mysql":
+        return queryset.explain(format="json")
+    return queryset.explain()
+
+
+def find_problems(plan) -> set:
+    """Find the full scans and filesorts in a query plan
+
+    Args:
+        plan (str): The output of explain
+
+    Returns:
+        set: SCAN and/or FILESORT
+    """
+
+    problems = set()
+    if connection.vendor == "mysql":
+        plan = json.dumps(json.loads(plan))
+        if '"access_type": "ALL"' in plan:
+            problems.add(SCAN)
+        if '"using_filesort": true' in plan:
+            problems.add(FILESORT)
+    else:
+        if SQLITE_SCAN.search(plan):
+            problems.add(SCAN)
+        if SQLITE_SORT.search(plan):
+            problems.add(FILESORT)
+    return problems
+
+
+def check_hot_queries() -> list:
+    """Explain every hot query
+
+    Returns:
+        list: (name, plan, problems, accepted problems) of each hot query
+    """
+
+    results = []
+    for name, (func, allow) in HOT_QUERIES.items():
+        plan = explain(func())
+        problems = find_problems(plan)
+        results.append((name, plan, problems - allow, problems & allow))
+    return results
@@ -0,0 +1,141 @@
+import random
+import re
+
+from django.db import connection, transaction
+from django.db.models import DateTimeField, UUIDField, Value
+from django.utils import timezone
+
+from .models import Question, Question_bank
+
+# the fields copied from the question bank, the quiz and the creation time
+# are added by the query
+COPIED_FIELDS = [
+    "title",
+    "choice_1",
+    "choice_2",
+    "choice_3",
+    "choice_4",
+    "choice_5",
+    "correct",
+    "marks",
+    "isShuffle",
+]
+
+
+def copy_to_quiz(queryset, quiz) -> int:
+    """Add the questions of a question bank queryset to a quiz
+
+    The rows are copied by the database with a single
+    INSERT INTO question (...) SELECT ... FROM question_bank, so they are
+    never loaded into python. bulk_create would not send post_save either,
+    the caller invalidates the cached data of the quiz.
+
+    Args:
+        queryset (QuerySet): The Question_bank rows to copy
+        quiz (Quiz): The quiz to add the questions to
+
+    Returns:
+        int: the number of questions added
+    """
+
+    rows = queryset.annotate(
+        copy_quiz_id=Value(quiz.pk, output_field=UUIDField()),
+        copy_created_at=Value(timezone.now(), output_field=DateTimeField()),
+    ).values_list(*COPIED_FIELDS, "copy_quiz_id", "copy_created_at")
+    select, params = rows.query.sql_with_params()
+
+    fields = COPIED_FIELDS + ["quiz", "created_at"]
+    columns = ", ".join(
+        connection.ops.quote_name(Question._meta.get_field(field).column)
+        for field in fields
+    )
+    table = connection.ops.quote_name(Question._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({columns}) {select}", params)
+        return cursor.rowcount
+
+
+# "<count> <level> <tag>", e.g. "10 easy C", the parts separated by commas
+BLUEPRINT_PART = re.compile(r"^(\d+)\s+(\S+)\s+(\S+)$")
+TAGS = {tag.lower(): tag for tag, _ in Question_bank.TAGS}
+LEVELS = {level.lower(): level for level, _ in Question_bank.LEVELS}
+LEVELS.update({name.lower(): level for level, name in Question_bank.LEVELS})
+
+
+def parse_blueprint(blueprint) -> dict:
+    """Parse a blueprint like "10 easy C, 5 intermediate ds, 3 advanced os"
+
+    Raises:
+        ValueError: the blueprint is not valid
+
+    Returns:
+        dict: (tag, level) -> number of questions
+    """
+
+    counts = {}
+    for part in blueprint.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = BLUEPRINT_PART.match(part)
+        if not match:
+            raise ValueError(f"{part!r} is not like '10 easy C'")
+        count, level, tag = match.groups()
+        if level.lower() not in LEVELS:
+            raise ValueError(f"unknown level {level!r}")
+        if tag.lower() not in TAGS:
+            raise ValueError(f"unknown tag {tag!r}")
+        key = (TAGS[tag.lower()], LEVELS[level.lower()])
+        counts[key] = counts.get(key, 0) + int(count)
+    if not counts:
+        raise ValueError("the blueprint is empty")
+    return counts
+
+
+def sample_questions(tag, level, count) -> list:
+    """Pick count random questions of a tag and level
+
+    Only the ids of the tag and level are read, from the index on
+    (tag, level), and sampled in python instead of sorting the bank by
+    RAND() in the database.
+
+    Raises:
+        ValueError: the bank has fewer than count such questions
+
+    Returns:
+        list: the ids of the questions
+    """
+
+    ids = list(
+        Question_bank.objects.filter(tag=tag, level=level)
+        .order_by()
+        .values_list("pk", flat=True)
+    )
+    if len(ids) < count:
+        raise ValueError(
+            f"only {len(ids)} {level} {tag} questions in the bank, {count} asked"
+        )
+    return random.sample(ids, count)
+
+
+def generate_from_blueprint(quiz, blueprint) -> int:
+    """Add random questions from the question bank to a quiz as per a blueprint
+
+    Nothing is added unless every part of the blueprint can be drawn, the
+    questions are then copied with a single insert.
+
+    Args:
+        quiz (Quiz): The quiz to add the questions to
+        blueprint (str): e.g. "10 easy C, 5 intermediate ds, 3 advanced os"
+
+    Raises:
+        ValueError: the blueprint is not valid or the bank is too small
+
+    Returns:
+        int: the number of questions added
+    """
+
+    ids = []
+    for (tag, level), count in parse_blueprint(blueprint).items():
+        ids += sample_questions(tag, level, count)
+    return copy_to_quiz(Question_bank.objects.filter(pk__in=ids), quiz)
@@ -0,0 +1,233 @@
+from io import BytesIO
+from itertools import islice
+
+import openpyxl
+import xlrd
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Question_bank, QuestionBankImport
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 100
+
+# column header in the workbook -> field, the same headers as the
+# import-export resource of the question bank admin
+COLUMNS = {
+    "Question Statement": "title",
+    "Option 1": "choice_1",
+    "Option 2": "choice_2",
+    "Option 3": "choice_3",
+    "Option 4": "choice_4",
+    "Option 5": "choice_5",
+    "Correct Answer-1": "correct",
+    "Marks": "marks",
+    "Tag": "tag",
+    "isShuffle": "isShuffle",
+    "Level": "level",
+}
+REQUIRED = ("title", "choice_1", "choice_2", "correct", "tag")
+TAGS = {tag for tag, _ in Question_bank.TAGS}
+LEVELS = {level for level, _ in Question_bank.LEVELS}
+
+
+class InvalidWorkbook(Exception):
+    """The workbook can't be imported at all"""
+
+
+def read_rows(data, filename):
+    """Iterate over the rows of the first sheet without loading it at once
+
+    Returns:
+        tuple: (number of rows or None if unknown, iterator of the rows)
+    """
+
+    try:
+        if filename.lower().endswith(".xls"):
+            workbook = xlrd.open_workbook(file_contents=data, on_demand=True)
+            sheet = workbook.sheet_by_index(0)
+            return sheet.nrows, (sheet.row_values(i) for i in range(sheet.nrows))
+        workbook = openpyxl.load_workbook(BytesIO(data), read_only=True, data_only=True)
+        sheet = workbook.worksheets[0]
+        return sheet.max_row, sheet.iter_rows(values_only=True)
+    except Exception:
+        raise InvalidWorkbook(f"{filename} is not a valid Excel workbook")
+
+
+def text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def parse_row(row, columns):
+    """Validate a row and turn it into the fields of a question
+
+    Args:
+        row (tuple): The values of the row
+        columns (dict): index of the column -> field
+
+    Raises:
+        ValueError: the row is not a valid question
+
+    Returns:
+        dict: the fields of the question
+    """
+
+    values = {
+        field: text(row[i]) if i < len(row) else None for i, field in columns.items()
+    }
+    missing = [field for field in REQUIRED if not values.get(field)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    try:
+        marks = int(values.get("marks") or 1)
+    except ValueError:
+        raise ValueError(f"marks {values['marks']!r} is not a number")
+    if marks < 0:
+        raise ValueError("marks can't be negative")
+    if values["tag"] not in TAGS:
+        raise ValueError(f"unknown tag {values['tag']!r}")
+    level = values.get("level") or Question_bank.BEGINNER
+    if level not in LEVELS:
+        raise ValueError(f"unknown level {level!r}")
+    isShuffle = (values.get("isShuffle") or "1").lower() not in ("0", "false", "no")
+
+    return dict(
+        title=values["title"],
+        choice_1=values["choice_1"],
+        choice_2=values["choice_2"],
+        choice_3=values.get("choice_3"),
+        choice_4=values.get("choice_4"),
+        choice_5=values.get("choice_5"),
+        correct=values["correct"],
+        marks=marks,
+        tag=values["tag"],
+        isShuffle=isShuffle,
+        level=level,
+    )
+
+
+def import_question_bank(bankImport):
+    """Import the workbook of an upload into the question bank
+
+    The rows are validated and inserted in batches of BATCH_SIZE, the
+    questions already in the bank or earlier in the file are skipped. The
+    progress is saved after every batch so that it can be followed in the
+    admin, running the import again skips the questions already imported.
+
+    Args:
+        bankImport (QuestionBankImport): The upload to import
+    """
+
+    total, rows = read_rows(bytes(bankImport.file), bankImport.filename)
+    header = next(rows, None)
+    columns = {
+        i: COLUMNS[str(name).strip()]
+        for i, name in enumerate(header or ())
+        if name is not None and str(name).strip() in COLUMNS
+    }
+    missing = [
+        name
+        for name, field in COLUMNS.items()
+        if field in REQUIRED and field not in columns.values()
+    ]
+    if missing:
+        raise InvalidWorkbook(f"Missing columns: {', '.join(missing)}")
+
+    progress = dict(
+        total_rows=total - 1 if total else None,
+        processed_rows=0,
+        created_count=0,
+        duplicate_count=0,
+        error_count=0,
+    )
+    errors = []
+    seen = set()
+    row_number = 1
+    while True:
+        chunk = list(islice(rows, BATCH_SIZE))
+        if not chunk:
+            break
+
+        questions = []
+        for row in chunk:
+            row_number += 1
+            if not any(value not in (None, "") for value in row):
+                continue
+            try:
+                question = Question_bank(**parse_row(row, columns))
+            except ValueError as e:
+                progress["error_count"] += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append(f"Row {row_number}: {e}")
+                continue
+            question.content_hash = question.get_content_hash()
+            questions.append(question)
+
+        hashes = {question.content_hash for question in questions}
+        seen.update(
+            Question_bank.objects.filter(content_hash__in=hashes).values_list(
+                "content_hash", flat=True
+            )
+        )
+        batch = []
+        for question in questions:
+            if question.content_hash in seen:
+                progress["duplicate_count"] += 1
+                continue
+            seen.add(question.content_hash)
+            batch.append(question)
+        # bulk_create does not call save, the hash is set above
+        try:
+            with transaction.atomic():
+                Question_bank.objects.bulk_create(batch)
+        except IntegrityError:
+            # some questions were added meanwhile, e.g. by a concurrent import
+            # of the same file, the unique hash keeps them from being doubled
+            added = set(
+                Question_bank.objects.filter(
+                    content_hash__in=[question.content_hash for question in batch]
+                ).values_list("content_hash", flat=True)
+            )
+            progress["duplicate_count"] += len(added)
+            batch = [
+                question for question in batch if question.content_hash not in added
+            ]
+            Question_bank.objects.bulk_create(batch, ignore_conflicts=True)
+
+        progress["created_count"] += len(batch)
+        progress["processed_rows"] += len(chunk)
+        QuestionBankImport.objects.filter(pk=bankImport.pk).update(
+            errors="\n".join(errors), **progress
+        )
+
+
+def run(import_id):
+    """Run the import of an upload, recording the outcome"""
+
+    QuestionBankImport.objects.filter(pk=import_id).update(
+        status=QuestionBankImport.RUNNING
+    )
+    bankImport = QuestionBankImport.objects.get(pk=import_id)
+    try:
+        import_question_bank(bankImport)
+    except InvalidWorkbook as e:
+        QuestionBankImport.objects.filter(pk=import_id).update(
+            status=QuestionBankImport.FAILED, errors=str(e), finished_at=timezone.now()
+        )
+        return
+    except Exception:
+        # retried by the job queue
+        QuestionBankImport.objects.filter(pk=import_id).update(
+            status=QuestionBankImport.PENDING
+        )
+        raise
+    # the upload is not needed anymore once it is imported
+    QuestionBankImport.objects.filter(pk=import_id).update(
+        status=QuestionBankImport.DONE, file=b"", finished_at=timezone.now()
+    )
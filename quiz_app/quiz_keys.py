@@ -0,0 +1,51 @@
+from django.core.cache import cache
+
+from .models import Quiz
+
+KEY_TIMEOUT = 5 * 60
+# Unknown keys are remembered briefly so that repeated typos don't reach the
+# database, a quiz created with the key is found once its entry is dropped
+UNKNOWN_KEY_TIMEOUT = 30
+
+_UNKNOWN = ()
+
+
+def normalize(key) -> str:
+    """Quiz keys are stored uppercase by Quiz.save"""
+
+    return key.strip().upper()
+
+
+def key_cache_key(key) -> str:
+    return f"quiz_key:{normalize(key)}"
+
+
+def resolve(key):
+    """Find the quiz joined with the given key
+
+    Args:
+        key (str): The key typed by the quiz taker
+
+    Returns:
+        tuple: (quiz_id, start_date, end_date) or None if no quiz has the key
+    """
+
+    cache_key = key_cache_key(key)
+    entry = cache.get(cache_key)
+    if entry is None:
+        entry = (
+            Quiz.objects.filter(key=normalize(key))
+            .values_list("quiz_id", "start_date", "end_date")
+            .first()
+        )
+        if entry is None:
+            cache.set(cache_key, _UNKNOWN, UNKNOWN_KEY_TIMEOUT)
+        else:
+            cache.set(cache_key, entry, KEY_TIMEOUT)
+    return entry or None
+
+
+def invalidate(*keys):
+    """Drop the cached entries of the given quiz keys"""
+
+    cache.delete_many([key_cache_key(key) for key in keys if key])
@@ -0,0 +1,123 @@
+import math
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min, Q, StdDev, Sum
+from django.utils import timezone
+
+from .models import QuizTakers
+
+# While attempts can still change the report is only cached for a short time,
+# once the last attempt is over the report is final
+LIVE_TIMEOUT = 60
+FINAL_TIMEOUT = 24 * 60 * 60
+
+PERCENTILES = (25, 50, 75, 90)
+
+# the columns of the quiz takers the report is computed from
+FIELDS = {"started", "completed", "marks_obtained"}
+
+
+def is_final(quiz) -> bool:
+    """Whether every attempt of the quiz is over
+
+    A quiz taker who started just before the end of the quiz gets the whole
+    duration, so the results only stop changing one duration after the end.
+    """
+
+    return quiz.end_date + timedelta(minutes=quiz.duration) < timezone.now()
+
+
+def report_cache_key(quiz_id, final) -> str:
+    return f"quiz_report:{quiz_id}:{'final' if final else 'live'}"
+
+
+def percentiles(histogram, count, points=PERCENTILES) -> dict:
+    """Nearest rank percentiles of the scores of a sorted histogram
+
+    Args:
+        histogram (list): (marks, number of quiz takers) sorted by marks
+        count (int): The number of quiz takers in the histogram
+        points (tuple): The percentiles to compute
+
+    Returns:
+        dict: percentile -> marks
+    """
+
+    result = {}
+    if not count:
+        return result
+    ranks = sorted((max(math.ceil(p * count / 100), 1), p) for p in points)
+    cumulative = 0
+    for marks, number in histogram:
+        cumulative += number
+        while ranks and ranks[0][0] <= cumulative:
+            result[ranks.pop(0)[1]] = marks
+    return result
+
+
+def compute_quiz_report(quiz) -> dict:
+    """Compute the statistics of a quiz with aggregate queries
+
+    Only the histogram, one row per distinct score, is loaded into python so
+    the memory used doesn't grow with the number of quiz takers.
+
+    The scores are those of the quiz takers who started the quiz, the ones who
+    never did are counted as no shows instead of scoring 0.
+    """
+
+    total_marks = quiz.question_set.aggregate(Sum("marks"))["marks__sum"] or 0
+    quizTakers = QuizTakers.objects.filter(quiz=quiz).order_by()
+    attempted = Q(started__isnull=False)
+    stats = quizTakers.aggregate(
+        count=Count("pk"),
+        # not named after a column, the filters would use the aggregate
+        attempted=Count("pk", filter=attempted),
+        completed=Count("pk", filter=Q(completed__isnull=False)),
+        passed=Count(
+            "pk", filter=attempted & Q(marks_obtained__gt=total_marks * 33 / 100)
+        ),
+        mean=Avg("marks_obtained", filter=attempted),
+        stddev=StdDev("marks_obtained", filter=attempted),
+        minimum=Min("marks_obtained", filter=attempted),
+        maximum=Max("marks_obtained", filter=attempted),
+    )
+    histogram = list(
+        quizTakers.filter(attempted)
+        .values_list("marks_obtained")
+        .annotate(number=Count("pk"))
+        .order_by("marks_obtained")
+    )
+    count = stats["count"]
+    started = stats["attempted"]
+    scores = percentiles(histogram, started)
+    return dict(
+        stats,
+        no_shows=count - started,
+        total_marks=total_marks,
+        histogram=dict(histogram),
+        median=scores.get(50),
+        percentiles=scores,
+        pass_rate=100 * stats["passed"] / started if started else 0,
+        completion_rate=100 * stats["completed"] / count if count else 0,
+    )
+
+
+def get_quiz_report(quiz) -> dict:
+    """Get the statistics of a quiz from the cache, computing them if needed"""
+
+    final = is_final(quiz)
+    key = report_cache_key(quiz.pk, final)
+    report = cache.get(key)
+    if report is None:
+        report = compute_quiz_report(quiz)
+        cache.set(key, report, FINAL_TIMEOUT if final else LIVE_TIMEOUT)
+    return report
+
+
+def invalidate(quiz_id):
+    """Drop the cached reports of a quiz"""
+
+    cache.delete_many(
+        [report_cache_key(quiz_id, True), report_cache_key(quiz_id, False)]
+    )
@@ -0,0 +1,115 @@
+import re
+from itertools import islice
+
+from . import reports
+from .models import Account, QuizTakers
+
+CHUNK_SIZE = 1000
+MAX_UNMATCHED = 50
+
+EMAIL_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def parse_emails(text) -> list:
+    """Split a roster into its normalized emails, in order and without
+    duplicates
+
+    The emails can be separated by new lines, commas, semicolons or spaces,
+    so a single column csv or a list pasted from a spreadsheet both work.
+    """
+
+    emails = (
+        Account.objects.normalize_email(email.strip("\"'<>"))
+        for email in EMAIL_SEPARATORS.split(text)
+    )
+    return list(dict.fromkeys(email for email in emails if "@" in email))
+
+
+def chunks(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def assign_users(quiz, user_ids) -> tuple:
+    """Add the quiz takers of the users not assigned to the quiz yet
+
+    Args:
+        quiz (Quiz): The quiz to assign the users to
+        user_ids (iterable): The primary keys of the users
+
+    Returns:
+        tuple: (users, users already assigned, users assigned)
+    """
+
+    users = already = assigned = 0
+    for chunk in chunks(user_ids):
+        existing = set(
+            QuizTakers.objects.filter(quiz=quiz, user_id__in=chunk)
+            .order_by()
+            .values_list("user_id", flat=True)
+        )
+        new = [QuizTakers(quiz=quiz, user_id=pk) for pk in chunk if pk not in existing]
+        # a user assigned concurrently is skipped by the unique quiz taker
+        QuizTakers.objects.bulk_create(new, ignore_conflicts=True)
+        users += len(chunk)
+        already += len(existing)
+        assigned += len(new)
+    if assigned:
+        # bulk_create does not send the post_save signal
+        reports.invalidate(quiz.pk)
+    return users, already, assigned
+
+
+def assign_emails(quiz, emails) -> dict:
+    """Assign the accounts of a list of emails to a quiz
+
+    The emails are resolved to accounts CHUNK_SIZE at a time.
+
+    Args:
+        quiz (Quiz): The quiz to assign the accounts to
+        emails (list): The emails of the roster
+
+    Returns:
+        dict: the matched, unmatched, already_assigned and assigned counts,
+            and the first MAX_UNMATCHED unmatched emails
+    """
+
+    unmatched = []
+    user_ids = []
+    for chunk in chunks(emails):
+        found = dict(
+            Account.objects.filter(email__in=chunk)
+            .order_by()
+            .values_list("email", "pk")
+        )
+        user_ids += found.values()
+        unmatched += [email for email in chunk if email not in found]
+
+    matched, already, assigned = assign_users(quiz, user_ids)
+    return {
+        "matched": matched,
+        "unmatched": len(unmatched),
+        "already_assigned": already,
+        "assigned": assigned,
+        "unmatched_emails": unmatched[:MAX_UNMATCHED],
+    }
+
+
+def assign_queryset(quiz, queryset) -> dict:
+    """Assign the accounts of a queryset, e.g. a filtered changelist, to a quiz
+
+    Only the primary keys are read, CHUNK_SIZE rows at a time.
+
+    Returns:
+        dict: the matched, already_assigned and assigned counts
+    """
+
+    user_ids = queryset.order_by().values_list("pk", flat=True)
+    matched, already, assigned = assign_users(
+        quiz, user_ids.iterator(chunk_size=CHUNK_SIZE)
+    )
+    return {"matched": matched, "already_assigned": already, "assigned": assigned}
@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import answer_key, payload, quiz_keys, reports, suspicion
+from .models import Question, Quiz, QuizTakers
+
+
+def quiz_content_changed(quiz_id):
+    """Drop the cached data of a quiz whose content has changed
+
+    Also called after bulk operations, which don't send the model signals.
+    """
+
+    answer_key.invalidate(quiz_id)
+    payload.bump_version(quiz_id)
+    reports.invalidate(quiz_id)
+    suspicion.invalidate(quiz_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    """Drop the cached data of the quiz of a changed question"""
+
+    quiz_content_changed(instance.quiz_id)
+
+
+@receiver(pre_save, sender=Quiz)
+def quiz_key_changing(sender, instance, **kwargs):
+    """Drop the cached entry of the key a quiz had before it is changed"""
+
+    old_key = Quiz.objects.filter(pk=instance.pk).values_list("key", flat=True).first()
+    quiz_keys.invalidate(old_key)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    """Drop the cached data of a changed quiz"""
+
+    quiz_content_changed(instance.pk)
+    quiz_keys.invalidate(instance.key)
+
+
+@receiver(post_save, sender=QuizTakers)
+@receiver(post_delete, sender=QuizTakers)
+def quiz_taker_changed(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached report of the quiz of an added, submitted or removed attempt
+
+    Saves of only other columns, e.g. the extra details, keep the report. The
+    attempts updated in bulk, started or submitted, invalidate it themselves.
+    """
+
+    if update_fields is not None and not reports.FIELDS.intersection(update_fields):
+        return
+    reports.invalidate(instance.quiz_id)
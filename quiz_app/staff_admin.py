@@ -3,9 +3,15 @@ from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 
-from .admin import AccountAdmin, Question_bank_admin, QuestionAdmin, QuizAdmin
+from .admin import (
+    AccountAdmin,
+    Question_bank_admin,
+    QuestionAdmin,
+    QuizAdmin,
+    QuizExportAdmin,
+)
 from .forms import QuizAddFormStaff
-from .models import Account, Question_bank, Quiz
+from .models import Account, Question_bank, Quiz, QuizExport
 
 
 class StaffAdminSite(AdminSite):
@@ -111,7 +117,28 @@ class Question_bank_admin(Question_bank_admin):
         return request.user.is_staff
 
 
+class QuizExportAdmin(QuizExportAdmin):
+    """Allow the staff to view the exports of only their quizzes"""
+
+    # the filter would list the quizzes of the other staff
+    list_filter = ()
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_staff
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.filter(quiz__invigilator=request.user)
+
+
 staff_admin_site = StaffAdminSite(name="staff_admin")
 staff_admin_site.register(Account, AccountAdmin)
 staff_admin_site.register(Quiz, QuizAdmin)
 staff_admin_site.register(Question_bank, Question_bank_admin)
+staff_admin_site.register(QuizExport, QuizExportAdmin)
@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Quiz, QuizTakers
+
+# Events of the same attempt within the window are counted once, a flaky
+# laptop fires bursts of blur events for a single move away from the test
+COALESCE_WINDOW = 2
+MAX_COUNT_TIMEOUT = 5 * 60
+
+
+def window_key(quiz_id, user_id) -> str:
+    return f"suspicion_window:{quiz_id}:{user_id}"
+
+
+def max_count_key(quiz_id) -> str:
+    return f"quiz_max_suspicion:{quiz_id}"
+
+
+def get_max_suspicion_count(quiz_id):
+    """Get the max_suspicion_count of a quiz from the cache
+
+    Returns:
+        int: the max suspicion count or None if the quiz does not exist
+    """
+
+    key = max_count_key(quiz_id)
+    max_count = cache.get(key)
+    if max_count is None:
+        max_count = (
+            Quiz.objects.filter(pk=quiz_id)
+            .values_list("max_suspicion_count", flat=True)
+            .first()
+        )
+        if max_count is not None:
+            cache.set(key, max_count, MAX_COUNT_TIMEOUT)
+    return max_count
+
+
+def increase(quiz_id, user_id) -> bool:
+    """Count a suspicious event of an attempt with a single UPDATE
+
+    Args:
+        quiz_id (UUID): The id of the quiz
+        user_id (int): The id of the quiz taker
+
+    Raises:
+        QuizTakers.DoesNotExist: The user is not a taker of the quiz
+
+    Returns:
+        bool: False if the event was coalesced with a previous one
+    """
+
+    key = window_key(quiz_id, user_id)
+    if not cache.add(key, True, COALESCE_WINDOW):
+        return False
+    updated = QuizTakers.objects.filter(quiz_id=quiz_id, user_id=user_id).update(
+        suspicion_count=F("suspicion_count") + 1
+    )
+    if not updated:
+        cache.delete(key)
+        raise QuizTakers.DoesNotExist()
+    return True
+
+
+def max_reached(quiz_id, user_id) -> bool:
+    """Whether the attempt reached the max suspicion count of the quiz"""
+
+    suspicion_count = (
+        QuizTakers.objects.filter(quiz_id=quiz_id, user_id=user_id)
+        .values_list("suspicion_count", flat=True)
+        .first()
+    )
+    max_count = get_max_suspicion_count(quiz_id)
+    if suspicion_count is None or max_count is None:
+        return False
+    return suspicion_count >= max_count
+
+
+def invalidate(quiz_id):
+    """Drop the cached max suspicion count of a quiz"""
+
+    cache.delete(max_count_key(quiz_id))
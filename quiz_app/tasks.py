@@ -0,0 +1,41 @@
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+
+from . import jobs, question_import
+from .excel import generate_result_as_excel
+from .models import QuizTakers
+
+
+@jobs.handler("submission_finished")
+def submission_finished(quizTaker_id):
+    """Mail the confirmation along with the result of a submitted quiz"""
+
+    quizTaker = QuizTakers.objects.select_related("quiz", "user").get(
+        pk=quizTaker_id
+    )
+    user = quizTaker.user
+    context = {
+        "name": user.full_name,
+        "title": quizTaker.quiz.title,
+        "started": quizTaker.started,
+        "completed": quizTaker.ended_at,
+    }
+    msg_plain = render_to_string("email/test_confirmation.txt", context)
+    msg_html = render_to_string("email/test_confirmation.html", context)
+    email = EmailMultiAlternatives(
+        "Test submitted successfully", msg_plain, "webmaster@localhost", [user.email],
+    )
+    email.attach_alternative(msg_html, "text/html")
+
+    responses = quizTaker.responses_with_unanswered()
+    filename = f"Result {user.full_name}.xlsx"
+    output = generate_result_as_excel(user, quizTaker.quiz, quizTaker, responses)
+    email.attach(filename, content=output.read(), mimetype="application/vnd.ms-excel")
+    email.send()
+
+
+@jobs.handler("import_question_bank")
+def import_question_bank(import_id):
+    """Import an uploaded question bank workbook"""
+
+    question_import.run(import_id)
@@ -1,3 +1,1258 @@
-from django.test import TestCase
+import json
+import os
+import smtplib
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import openpyxl
+
+from django.apps import apps
+from django.contrib.auth import authenticate
+from django.core import mail as django_mail
+from django.core.cache import _create_cache, cache, caches
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz_app import cache as tiered_cache
+from quiz_app import (
+    answer_key,
+    entry,
+    jobs,
+    mail,
+    metrics,
+    payload,
+    query_plans,
+    question_bank,
+    question_import,
+    quiz_keys,
+    reports,
+    roster,
+    views,
+)
+from quiz_app.management.commands.close_expired_attempts import (
+    close_expired_attempts,
+)
+from quiz_app.excel import generate_quiz_results_as_excel
+from quiz_app.forms import SignUpForm
+from quiz_app.models import (
+    Account,
+    Job,
+    OutgoingMail,
+    Question,
+    Question_bank,
+    QuestionBankImport,
+    Quiz,
+    QuizExport,
+    QuizTakers,
+    Response,
+)
+
+
+class HotQueryPlanTests(TestCase):
+    """The hot queries must keep using the indexes of the migrations"""
+
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command("explain_hot_queries", stdout=out)
+        self.assertNotIn("full scan", out.getvalue())
+
+    @skipUnless(connection.vendor == "sqlite", "reads the SQLite plan format")
+    def test_scan_and_filesort_are_flagged(self):
+        plan = query_plans.explain(Quiz.objects.filter(title="Quiz").order_by("duration"))
+        self.assertEqual(
+            query_plans.find_problems(plan), {query_plans.SCAN, query_plans.FILESORT}
+        )
+
+    @skipUnless(connection.vendor == "sqlite", "reads the SQLite plan format")
+    def test_index_search_is_not_flagged(self):
+        plan = query_plans.explain(Quiz.objects.filter(key="ABCDEF"))
+        self.assertEqual(query_plans.find_problems(plan), set())
+
+
+# the in memory backend stands in for the SMTP server, the test runner sets
+# EMAIL_BACKEND to it as well so the outbox is set back explicitly
+@override_settings(
+    EMAIL_BACKEND="quiz_app.mail.OutboxBackend",
+    MAIL_OUTBOX={
+        "BACKEND": "django.core.mail.backends.locmem.EmailBackend",
+        "RATE": 1000,
+        "MAX_ATTEMPTS": 2,
+    },
+)
+class OutboxTests(TestCase):
+    """The mails are stored in the outbox and delivered by the sender"""
+
+    def test_mails_are_queued_then_delivered(self):
+        send_mail("Verify", "Link", "webmaster@localhost", ["a@example.com"])
+        message = EmailMultiAlternatives(
+            "Result", "Marks", "webmaster@localhost", ["b@example.com"]
+        )
+        message.attach("Result.xlsx", b"xlsx", "application/vnd.ms-excel")
+        message.send()
+        self.assertEqual(len(django_mail.outbox), 0)
+        self.assertEqual(OutgoingMail.objects.filter(status="pending").count(), 2)
+
+        mail.work(burst=True)
+
+        self.assertEqual([m.subject for m in django_mail.outbox], ["Verify", "Result"])
+        self.assertEqual(django_mail.outbox[1].attachments[0][0], "Result.xlsx")
+        self.assertEqual(OutgoingMail.objects.filter(status="sent").count(), 2)
+
+    def test_failed_mails_are_retried_then_dead(self):
+        send_mail("Verify", "Link", "webmaster@localhost", ["a@example.com"])
+        with override_settings(
+            MAIL_OUTBOX={"BACKEND": "quiz_app.tests.BrokenBackend", "MAX_ATTEMPTS": 2}
+        ):
+            mail.work(burst=True)
+            outgoing = OutgoingMail.objects.get()
+            self.assertEqual((outgoing.status, outgoing.attempts), ("pending", 1))
+
+            # due again once the backoff is over
+            OutgoingMail.objects.update(run_at=outgoing.created_at)
+            with self.assertLogs("quiz_app.mail", "ERROR"):
+                mail.work(burst=True)
+            outgoing.refresh_from_db()
+            self.assertEqual((outgoing.status, outgoing.attempts), ("dead", 2))
+        self.assertIn("SMTPServerDisconnected", outgoing.last_error)
+
+
+class BrokenBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+
+class QuizTestCase(TestCase):
+    """A running quiz of 3 questions with a candidate and another user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Account.objects.create_superuser("staff@example.com", "Staff")
+        cls.user = Account.objects.create_user("candidate@example.com", "Candidate")
+        cls.other = Account.objects.create_user("other@example.com", "Other")
+        now = timezone.now()
+        cls.quiz = Quiz.objects.create(
+            title="Quiz",
+            invigilator=cls.staff,
+            start_date=now - timedelta(minutes=5),
+            end_date=now + timedelta(hours=1),
+            duration=60,
+        )
+        cls.questions = [
+            Question.objects.create(
+                quiz=cls.quiz,
+                title=f"Question {i}",
+                choice_1="A",
+                choice_2="B",
+                correct="A",
+                marks=i + 1,
+            )
+            for i in range(3)
+        ]
+        cls.quizTaker = QuizTakers.objects.create(
+            quiz=cls.quiz, user=cls.user, started=now
+        )
+        cls.otherTaker = QuizTakers.objects.create(
+            quiz=cls.quiz, user=cls.other, started=now
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+
+class CompletedTests(QuizTestCase):
+    """Submitting an attempt"""
+
+    def complete(self, quizTaker_id):
+        return self.client.post(reverse("completed"), {"quizTaker": quizTaker_id})
+
+    def test_submission_is_recorded_once(self):
+        self.assertEqual(self.complete(self.quizTaker.pk).status_code, 200)
+        self.assertEqual(self.complete(self.quizTaker.pk).status_code, 200)
+        self.quizTaker.refresh_from_db()
+        self.assertIsNotNone(self.quizTaker.completed)
+        self.assertEqual(Job.objects.filter(name="submission_finished").count(), 1)
+
+    def test_summary_columns_are_not_written(self):
+        QuizTakers.objects.filter(pk=self.quizTaker.pk).update(
+            marks_obtained=5, suspicion_count=2
+        )
+        self.complete(self.quizTaker.pk)
+        self.quizTaker.refresh_from_db()
+        self.assertEqual(
+            (self.quizTaker.marks_obtained, self.quizTaker.suspicion_count), (5, 2)
+        )
+
+    def test_attempt_of_another_user_is_not_found(self):
+        self.assertEqual(self.complete(self.otherTaker.pk).status_code, 404)
+        self.assertEqual(self.complete("").status_code, 404)
+        self.otherTaker.refresh_from_db()
+        self.assertIsNone(self.otherTaker.completed)
+        self.assertFalse(Job.objects.exists())
+
+
+def fail(**payload):
+    raise ValueError("Broken handler")
+
+
+@override_settings(JOB_QUEUE={"MAX_ATTEMPTS": 3, "BACKOFF": 30, "LOCK_TIMEOUT": 600})
+class JobQueueTests(QuizTestCase):
+    """The jobs are claimed in order, retried with a backoff then failed"""
+
+    def test_claim_takes_the_due_jobs_in_order(self):
+        now = timezone.now()
+        later = Job.objects.create(name="fail", run_at=now - timedelta(seconds=1))
+        first = Job.objects.create(name="fail", run_at=now - timedelta(minutes=1))
+        Job.objects.create(name="fail", run_at=now + timedelta(minutes=1))
+
+        self.assertEqual(jobs.claim(), first)
+        self.assertEqual(jobs.claim(), later)
+        self.assertIsNone(jobs.claim())
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ("running", 1))
+        self.assertIsNotNone(first.locked_at)
+
+    def test_stale_running_jobs_are_reclaimed(self):
+        now = timezone.now()
+        stale = Job.objects.create(
+            name="fail",
+            status=Job.RUNNING,
+            attempts=1,
+            locked_at=now - timedelta(seconds=601),
+        )
+        Job.objects.create(
+            name="fail",
+            status=Job.RUNNING,
+            attempts=1,
+            locked_at=now - timedelta(seconds=599),
+        )
+
+        self.assertEqual(jobs.claim(), stale)
+        self.assertIsNone(jobs.claim())
+        stale.refresh_from_db()
+        self.assertEqual(stale.attempts, 2)
+
+    @patch.dict(jobs._handlers, {"fail": fail})
+    def test_failed_jobs_are_retried_with_backoff_then_failed(self):
+        job = jobs.enqueue("fail", quiz_id=1)
+        for attempt, backoff in [(1, 30), (2, 60)]:
+            before = timezone.now()
+            jobs.work(burst=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("pending", attempt))
+            self.assertGreaterEqual(job.run_at, before + timedelta(seconds=backoff))
+            self.assertLess(job.run_at, before + timedelta(seconds=backoff + 5))
+            self.assertIsNone(job.locked_at)
+
+            # due again once the backoff is over
+            Job.objects.update(run_at=before)
+
+        with self.assertLogs("quiz_app.jobs", "ERROR"):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 3))
+        self.assertIn("Broken handler", job.last_error)
+
+    def test_submission_finished_mails_the_result(self):
+        self.quizTaker.completed = timezone.now()
+        self.quizTaker.save()
+        Response.objects.create(
+            quiztaker=self.quizTaker, question=self.questions[0], answer="A"
+        )
+        job = jobs.enqueue("submission_finished", quizTaker_id=self.quizTaker.pk)
+
+        jobs.work(burst=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), ("done", None))
+        self.assertEqual(len(django_mail.outbox), 1)
+        message = django_mail.outbox[0]
+        self.assertEqual(message.to, ["candidate@example.com"])
+        self.assertEqual(message.alternatives[0][1], "text/html")
+        filename, content, mimetype = message.attachments[0]
+        self.assertEqual(filename, "Result Candidate.xlsx")
+        sheet = openpyxl.load_workbook(BytesIO(content)).active
+        self.assertGreater(sheet.max_row, 1)
+
+
+class AttemptStateTests(QuizTestCase):
+    """The state of the attempts is computed in the db for the profile"""
+
+    def add_attempt(self, start, end, started=None, **kwargs):
+        now = timezone.now()
+        quiz = Quiz.objects.create(
+            title="Other quiz",
+            invigilator=self.staff,
+            start_date=now + start,
+            end_date=now + end,
+            duration=60,
+        )
+        return QuizTakers.objects.create(
+            quiz=quiz,
+            user=self.user,
+            started=started and now + started,
+            **kwargs,
+        )
+
+    def test_states(self):
+        hour = timedelta(hours=1)
+        missed = self.add_attempt(-2 * hour, -hour)
+        # ran out of time without being submitted, the deadline is
+        # started + duration minutes
+        deadline = self.add_attempt(-2 * hour, hour, -hour - timedelta(minutes=1))
+        running = self.add_attempt(-2 * hour, hour, -hour + timedelta(minutes=1))
+        submitted = self.add_attempt(
+            -2 * hour, hour, -timedelta(minutes=5), completed=timezone.now()
+        )
+        upcoming = self.add_attempt(hour, 2 * hour)
+
+        states = dict(
+            QuizTakers.objects.filter(user=self.user)
+            .with_state()
+            .values_list("pk", "state")
+        )
+        self.assertEqual(
+            states,
+            {
+                missed.pk: QuizTakers.MISSED,
+                deadline.pk: QuizTakers.ENDED,
+                running.pk: QuizTakers.CURRENT,
+                submitted.pk: QuizTakers.ENDED,
+                upcoming.pk: QuizTakers.UPCOMING,
+                self.quizTaker.pk: QuizTakers.CURRENT,
+            },
+        )
+        # the same as the properties computed in python
+        self.assertTrue(missed.was_missed)
+        self.assertTrue(deadline.has_ended)
+        self.assertFalse(running.has_ended)
+
+        # the login middleware records the session on the first request
+        self.client.get(reverse("profile"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [q.pk for q in response.context["current"]],
+            [self.quizTaker.pk, running.pk],
+        )
+        self.assertEqual([q.pk for q in response.context["upcoming"]], [upcoming.pk])
+        self.assertEqual(
+            {q.pk for q in response.context["past"]},
+            {missed.pk, deadline.pk, submitted.pk},
+        )
+        # viewing the profile does not close the attempts which ran out
+        writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")
+        ]
+        self.assertEqual(writes, [])
+        deadline.refresh_from_db()
+        self.assertIsNone(deadline.completed)
+
+    def test_past_attempts_are_paginated(self):
+        hour = timedelta(hours=1)
+        for i in range(views.PROFILE_PAGE_SIZE + 1):
+            self.add_attempt(-(i + 2) * hour, -(i + 1) * hour)
+
+        response = self.client.get(reverse("profile"))
+        past = response.context["past"]
+        self.assertEqual(len(past), views.PROFILE_PAGE_SIZE)
+        self.assertEqual(past.paginator.count, views.PROFILE_PAGE_SIZE + 1)
+        # the most recent first
+        self.assertEqual(
+            past[0].quiz.start_date,
+            max(q.quiz.start_date for q in past.paginator.object_list),
+        )
+
+        response = self.client.get(reverse("profile"), {"page": 2})
+        self.assertEqual(len(response.context["past"]), 1)
+        self.assertEqual(
+            [q.pk for q in response.context["current"]], [self.quizTaker.pk]
+        )
+
+
+class SaveExtraTests(QuizTestCase):
+    """Saving the extra information asked before an attempt"""
+
+    def save_extra(self, quiz_id):
+        return self.client.post(
+            reverse("save_extra"), {"quiz": quiz_id, "extra": '{"Roll No": "7"}'}
+        )
+
+    def test_only_extra_is_written(self):
+        QuizTakers.objects.filter(pk=self.quizTaker.pk).update(suspicion_count=3)
+        self.assertEqual(self.save_extra(self.quiz.pk).status_code, 200)
+        self.quizTaker.refresh_from_db()
+        self.assertEqual(
+            (self.quizTaker.extra, self.quizTaker.suspicion_count),
+            ('{"Roll No": "7"}', 3),
+        )
+
+    def test_missing_attempt_is_not_found(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.save_extra(self.quiz.pk).status_code, 404)
+        self.assertEqual(self.save_extra("not-a-uuid").status_code, 404)
+
+
+class SaveResponseTests(QuizTestCase):
+    """Saving one answer"""
+
+    def save(self, quizTaker_id, question, answer, quiz=None):
+        data = {"quizTaker": quizTaker_id, "question": question.pk, "answer": answer}
+        if quiz:
+            data["quiz"] = quiz
+        return self.client.post(reverse("save_response"), data)
+
+    def test_answer_is_created_then_updated(self):
+        question = self.questions[2]
+        self.assertEqual(self.save(self.quizTaker.pk, question, "A").status_code, 200)
+        self.save(self.quizTaker.pk, question, "B")
+        response = Response.objects.get(quiztaker=self.quizTaker)
+        self.assertEqual((response.answer, response.isCorrect), ("B", False))
+        self.quizTaker.refresh_from_db()
+        self.assertEqual(
+            (self.quizTaker.answered_count, self.quizTaker.marks_obtained), (1, 0)
+        )
+
+    def test_attempt_of_another_user_is_not_found(self):
+        response = self.save(self.otherTaker.pk, self.questions[0], "A")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Response.objects.exists())
+
+    def test_quiz_is_taken_from_the_attempt(self):
+        other = Quiz.objects.create(
+            title="Other",
+            invigilator=self.staff,
+            start_date=self.quiz.start_date,
+            end_date=self.quiz.end_date,
+        )
+        question = Question.objects.create(
+            quiz=other, title="Other", choice_1="A", choice_2="B", correct="A"
+        )
+        response = self.save(self.quizTaker.pk, question, "A", quiz=other.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Response.objects.exists())
+
+
+class LazyResponseTests(QuizTestCase):
+    """Response rows are only created for the answered questions"""
+
+    def test_starting_creates_no_responses(self):
+        QuizTakers.objects.filter(pk=self.quizTaker.pk).update(
+            started=None, extra="{}"
+        )
+        url = reverse("quiz", args=[self.quiz.pk])
+        page = self.client.get(url)
+        self.assertEqual(page.status_code, 200)
+        self.assertFalse(Response.objects.exists())
+        self.quizTaker.refresh_from_db()
+        self.assertIsNotNone(self.quizTaker.started)
+        self.assertEqual(self.quizTaker.total_marks, 6)
+        responses = json.loads(page.context["responses"])
+        self.assertEqual(
+            sorted(response["question"] for response in responses),
+            sorted(question.pk for question in self.questions),
+        )
+        self.assertEqual({response["answer"] for response in responses}, {""})
+
+        self.client.post(
+            reverse("save_response"),
+            {
+                "quizTaker": self.quizTaker.pk,
+                "question": self.questions[1].pk,
+                "answer": "A",
+            },
+        )
+        responses = json.loads(self.client.get(url).context["responses"])
+        answers = {response["question"]: response["answer"] for response in responses}
+        self.assertEqual(answers[self.questions[1].pk], "A")
+        self.assertEqual(Response.objects.count(), 1)
+
+    def test_unanswered_questions_are_listed(self):
+        Response.objects.create(
+            quiztaker=self.quizTaker,
+            question=self.questions[1],
+            answer="A",
+            isCorrect=True,
+            marks=2,
+        )
+        responses = self.quizTaker.responses_with_unanswered()
+        self.assertEqual(
+            [response.question for response in responses],
+            sorted(self.questions, key=lambda question: question.pk),
+        )
+        self.assertEqual([response.answer for response in responses], ["", "A", ""])
+        unsaved = [response.pk is None for response in responses]
+        self.assertEqual(unsaved, [True, False, True])
+
+
+class FillSummariesMigrationTests(QuizTestCase):
+    """The migration computing the summary columns of the existing attempts"""
+
+    fill_summaries = staticmethod(
+        import_module("quiz_app.migrations.0024_quiztakers_summary").fill_summaries
+    )
+
+    def test_summaries_are_computed_from_the_responses(self):
+        for question, answer in zip(self.questions, ["A", "", "B"]):
+            Response.objects.create(
+                quiztaker=self.quizTaker,
+                question=question,
+                answer=answer,
+                isCorrect=answer == "A",
+                marks=question.marks if answer == "A" else 0,
+            )
+        self.fill_summaries(apps, None)
+        summaries = QuizTakers.objects.order_by("user__email").values_list(
+            "answered_count", "correct_count", "marks_obtained", "total_marks"
+        )
+        self.assertEqual(list(summaries), [(2, 1, 1, 6), (0, 0, 0, 6)])
+
+
+class SaveResponsesTests(QuizTestCase):
+    """Saving a batch of answers"""
+
+    def save(self, quizTaker_id, *answers):
+        responses = [
+            {"question": question.pk, "answer": answer, "seq": seq}
+            for question, answer, seq in answers
+        ]
+        return self.client.post(
+            reverse("save_responses"),
+            {"quizTaker": quizTaker_id, "responses": json.dumps(responses)},
+        )
+
+    def summary(self):
+        self.quizTaker.refresh_from_db()
+        return (
+            self.quizTaker.answered_count,
+            self.quizTaker.correct_count,
+            self.quizTaker.marks_obtained,
+        )
+
+    def test_older_answer_does_not_overwrite_newer(self):
+        question = self.questions[0]
+        response = self.save(self.quizTaker.pk, (question, "B", 2))
+        self.assertEqual(response.status_code, 200)
+        self.save(self.quizTaker.pk, (question, "A", 1))
+        response = Response.objects.get(quiztaker=self.quizTaker)
+        self.assertEqual((response.answer, response.sequence), ("B", 2))
+        self.assertEqual(self.summary(), (1, 0, 0))
+
+    def test_latest_answer_of_a_batch_wins(self):
+        question = self.questions[1]
+        self.save(self.quizTaker.pk, (question, "A", 3), (question, "B", 1))
+        response = Response.objects.get(quiztaker=self.quizTaker)
+        self.assertEqual((response.answer, response.sequence), ("A", 3))
+        self.assertEqual(self.summary(), (1, 1, 2))
+
+    def test_summary_of_created_and_updated_answers(self):
+        first, second, third = self.questions
+        self.save(self.quizTaker.pk, (first, "A", 1), (second, "B", 1))
+        self.assertEqual(self.summary(), (2, 1, 1))
+        self.save(
+            self.quizTaker.pk, (first, "", 2), (second, "A", 2), (third, "A", 1)
+        )
+        self.assertEqual(self.summary(), (2, 2, 5))
+        self.assertEqual(Response.objects.filter(quiztaker=self.quizTaker).count(), 3)
+
+    def test_attempt_of_another_user_is_not_found(self):
+        response = self.save(self.otherTaker.pk, (self.questions[0], "A", 1))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Response.objects.exists())
+        response = self.save("abc", (self.questions[0], "A", 1))
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class QuizReportTests(QuizTestCase):
+    """The cached statistics of a quiz"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        QuizTakers.objects.filter(pk=cls.quizTaker.pk).update(marks_obtained=6)
+        QuizTakers.objects.filter(pk=cls.otherTaker.pk).update(marks_obtained=1)
+        absent = Account.objects.create_user("absent@example.com", "Absent")
+        QuizTakers.objects.create(quiz=cls.quiz, user=absent)
+
+    def test_no_shows_are_not_scored(self):
+        report = reports.compute_quiz_report(self.quiz)
+        self.assertEqual((report["count"], report["no_shows"]), (3, 1))
+        self.assertEqual((report["mean"], report["minimum"]), (3.5, 1))
+        self.assertEqual((report["passed"], report["pass_rate"]), (1, 50))
+        self.assertEqual(report["histogram"], {1: 1, 6: 1})
+        self.assertEqual(report["median"], 1)
+
+    def test_closing_attempts_drops_the_report(self):
+        self.assertEqual(reports.get_quiz_report(self.quiz)["completed"], 0)
+        closed = close_expired_attempts(timezone.now() + timedelta(hours=2))
+        self.assertEqual(closed, 2)
+        self.assertEqual(reports.get_quiz_report(self.quiz)["completed"], 2)
+
+    def test_submitting_drops_the_report(self):
+        self.assertEqual(reports.get_quiz_report(self.quiz)["completed"], 0)
+        self.client.post(reverse("completed"), {"quizTaker": self.quizTaker.pk})
+        self.assertEqual(reports.get_quiz_report(self.quiz)["completed"], 1)
+
+    def test_other_columns_keep_the_report(self):
+        report = reports.get_quiz_report(self.quiz)
+        self.quizTaker.extra = "{}"
+        self.quizTaker.save(update_fields=["extra"])
+        self.assertIsNotNone(cache.get(reports.report_cache_key(self.quiz.pk, False)))
+        self.quizTaker.marks_obtained = 1
+        self.quizTaker.save(update_fields=["marks_obtained"])
+        self.assertIsNone(cache.get(reports.report_cache_key(self.quiz.pk, False)))
+        self.assertNotEqual(reports.get_quiz_report(self.quiz), report)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class PayloadTests(QuizTestCase):
+    """The cached questions of a quiz"""
+
+    def test_payload_is_built_once_per_version(self):
+        first = payload.get_payload(self.quiz.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(payload.get_payload(self.quiz.pk), first)
+        self.assertEqual(set(first), {question.pk for question in self.questions})
+        self.assertNotIn('"correct"', first[self.questions[0].pk])
+
+        self.questions[0].title = "Changed"
+        self.questions[0].save()
+        changed = payload.get_payload(self.quiz.pk)
+        self.assertIn("Changed", changed[self.questions[0].pk])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class AnswerKeyTests(QuizTestCase):
+    """The answer keys cached by every process"""
+
+    def setUp(self):
+        super().setUp()
+        answer_key.answer_keys.clear()
+
+    def test_key_is_cached(self):
+        question = self.questions[1]
+        self.assertEqual(answer_key.grade(self.quiz.pk, question.pk, "A"), (True, 2))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                answer_key.grade(self.quiz.pk, question.pk, "B"), (False, 0)
+            )
+
+    def test_change_through_another_process_is_picked_up(self):
+        question = self.questions[0]
+        self.assertEqual(answer_key.grade(self.quiz.pk, question.pk, "A"), (True, 1))
+        # saved by another process: no signal here, only the shared version
+        Question.objects.filter(pk=question.pk).update(correct="B", marks=4)
+        payload.bump_version(self.quiz.pk)
+        self.assertEqual(answer_key.grade(self.quiz.pk, question.pk, "B"), (True, 4))
+        key = answer_key.get_answer_key(self.quiz.pk)
+        self.assertEqual(sum(marks for _, marks in key.values()), 9)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class QuizKeyTests(QuizTestCase):
+    """The cached lookup of the quiz of a key"""
+
+    def test_key_is_resolved_from_the_cache(self):
+        quiz = (self.quiz.pk, self.quiz.start_date, self.quiz.end_date)
+        self.assertEqual(quiz_keys.resolve(f" {self.quiz.key.lower()} "), quiz)
+        with self.assertNumQueries(0):
+            self.assertEqual(quiz_keys.resolve(self.quiz.key), quiz)
+
+    def test_changed_key_is_dropped(self):
+        old_key = self.quiz.key
+        quiz_keys.resolve(old_key)
+        self.quiz.key = "newkey1"
+        self.quiz.save()
+        self.assertIsNone(quiz_keys.resolve(old_key))
+        self.assertEqual(quiz_keys.resolve("NEWKEY1")[0], self.quiz.pk)
+
+    def test_changed_dates_are_seen(self):
+        quiz_keys.resolve(self.quiz.key)
+        self.quiz.end_date = self.quiz.start_date + timedelta(minutes=1)
+        self.quiz.save()
+        self.assertEqual(quiz_keys.resolve(self.quiz.key)[2], self.quiz.end_date)
+
+    def test_unknown_key_is_found_once_created(self):
+        self.assertIsNone(quiz_keys.resolve("ABCDEFG"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(quiz_keys.resolve("ABCDEFG"))
+        quiz = Quiz.objects.create(
+            title="New",
+            invigilator=self.staff,
+            key="ABCDEFG",
+            start_date=self.quiz.start_date,
+            end_date=self.quiz.end_date,
+        )
+        self.assertEqual(quiz_keys.resolve("abcdefg")[0], quiz.pk)
+
+
+class RosterTests(QuizTestCase):
+    """Assigning a list of students to a quiz"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.students = [
+            Account.objects.create_user(f"student{i}@example.com", f"Student {i}")
+            for i in range(3)
+        ]
+
+    def test_emails_are_parsed_normalized_and_deduplicated(self):
+        text = '"Student0@Example.com", student1@example.com;\n<STUDENT0@example.com>'
+        self.assertEqual(
+            roster.parse_emails(text + " not-an-email"),
+            ["student0@example.com", "student1@example.com"],
+        )
+
+    def test_emails_are_assigned_once(self):
+        emails = [
+            "candidate@example.com",
+            "student0@example.com",
+            "student1@example.com",
+            "missing@example.com",
+        ]
+        result = roster.assign_emails(self.quiz, emails)
+        self.assertEqual(
+            result,
+            {
+                "matched": 3,
+                "unmatched": 1,
+                "already_assigned": 1,
+                "assigned": 2,
+                "unmatched_emails": ["missing@example.com"],
+            },
+        )
+        result = roster.assign_emails(self.quiz, emails)
+        self.assertEqual((result["already_assigned"], result["assigned"]), (3, 0))
+        self.assertEqual(QuizTakers.objects.filter(quiz=self.quiz).count(), 4)
+
+    def test_ids_are_chunked(self):
+        self.assertEqual(list(roster.chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_queryset_is_assigned(self):
+        queryset = Account.objects.filter(email__startswith="student")
+        result = roster.assign_queryset(self.quiz, queryset)
+        self.assertEqual(result, {"matched": 3, "already_assigned": 0, "assigned": 3})
+
+    def test_roster_page_assigns_the_emails(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse("admin:account_assign_roster"),
+            {"quiz": self.quiz.pk, "emails": "student2@example.com"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            QuizTakers.objects.filter(quiz=self.quiz, user=self.students[2]).exists()
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class BlueprintTests(QuizTestCase):
+    """Random questions from the question bank"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        pools = [("C", "easy", 4), ("ds", "advanced", 2)]
+        for tag, level, count in pools:
+            for i in range(count):
+                Question_bank.objects.create(
+                    title=f"{level} {tag} {i}",
+                    choice_1="A",
+                    choice_2="B",
+                    correct="A",
+                    tag=tag,
+                    level=level,
+                )
+
+    def test_blueprint_is_parsed(self):
+        self.assertEqual(
+            question_bank.parse_blueprint("2 easy c, 1 Advanced DS,, 1 beginner C"),
+            {("C", "easy"): 3, ("ds", "advanced"): 1},
+        )
+        for blueprint in ["", "easy C", "1 hard C", "1 easy rust"]:
+            with self.assertRaises(ValueError):
+                question_bank.parse_blueprint(blueprint)
+
+    def test_questions_are_drawn_with_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            added = question_bank.generate_from_blueprint(
+                self.quiz, "3 easy C, 2 advanced ds"
+            )
+        self.assertEqual(added, 5)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        titles = list(
+            self.quiz.question_set.exclude(pk__in=[q.pk for q in self.questions])
+            .order_by("title")
+            .values_list("title", flat=True)
+        )
+        self.assertEqual(len(titles), 5)
+        self.assertEqual(sum(title.startswith("easy C") for title in titles), 3)
+        self.assertEqual(len(set(titles)), 5)
+
+    def test_nothing_is_added_from_a_small_bank(self):
+        with self.assertRaises(ValueError):
+            question_bank.generate_from_blueprint(self.quiz, "1 easy C, 3 advanced ds")
+        self.assertEqual(self.quiz.question_set.count(), 3)
+
+    def test_generate_page_drops_the_answer_key(self):
+        self.assertEqual(len(answer_key.get_answer_key(self.quiz.pk)), 3)
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse("admin:quiz_generate", args=[self.quiz.pk]),
+            {"blueprint": "2 easy C"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(answer_key.get_answer_key(self.quiz.pk)), 5)
+
+
+class SelectAcrossTests(QuizTestCase):
+    """The confirmation of the admin actions run on a whole changelist"""
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.staff)
+
+    def confirm(self, url, action, selected, apply):
+        """Run an action on every row, selecting one, then confirm it"""
+
+        data = {"action": action, "select_across": "1", "index": "0"}
+        data["_selected_action"] = [selected]
+        response = self.client.post(url, data)
+        self.assertContains(
+            response, f'name="_selected_action" value="{selected}"', html=False
+        )
+        self.assertContains(response, 'name="select_across" value="1"')
+        del data["index"]
+        data["apply"] = apply
+        return self.client.post(url, data)
+
+    def test_all_questions_are_added(self):
+        for i in range(3):
+            Question_bank.objects.create(
+                title=f"Bank {i}", choice_1="A", choice_2="B", correct="A", tag="C"
+            )
+        url = reverse("admin:quiz_app_question_bank_changelist")
+        url += f"?quizid={self.quiz.pk}"
+        selected = Question_bank.objects.first().pk
+        self.confirm(url, "add_questions_to_quiz", selected, "Import")
+        self.assertEqual(self.quiz.question_set.count(), 6)
+
+    def test_all_students_are_assigned(self):
+        for i in range(3):
+            Account.objects.create_user(f"student{i}@example.com", f"Student {i}")
+        url = reverse("admin:quiz_app_account_changelist")
+        url += f"?quizid={self.quiz.pk}"
+        selected = Account.objects.get(email="student0@example.com").pk
+        self.confirm(url, "assign_users", selected, "Assign Users")
+        self.assertEqual(
+            QuizTakers.objects.filter(quiz=self.quiz).count(),
+            Account.objects.count(),
+        )
+
+
+class QuizResultsExportTests(QuizTestCase):
+    """The workbook of the results of every quiz taker of a quiz"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for question, answer in ((cls.questions[0], "A"), (cls.questions[2], "B")):
+            Response.objects.create(
+                quiztaker=cls.quizTaker,
+                question=question,
+                answer=answer,
+                isCorrect=answer == "A",
+                marks=question.marks if answer == "A" else 0,
+            )
+        QuizTakers.objects.filter(pk=cls.quizTaker.pk).update(
+            answered_count=2, correct_count=1, marks_obtained=1, total_marks=6
+        )
+        absent = Account.objects.create_user("absent@example.com", "Absent")
+        QuizTakers.objects.create(quiz=cls.quiz, user=absent)
+
+    def export(self):
+        output = BytesIO()
+        counts = generate_quiz_results_as_excel(self.quiz, output)
+        output.seek(0)
+        workbook = openpyxl.load_workbook(output)
+        return counts, {
+            sheet.title: list(sheet.iter_rows(min_row=2, values_only=True))
+            for sheet in workbook.worksheets
+        }
+
+    def test_summary_has_every_quiz_taker(self):
+        (takers, rows), sheets = self.export()
+        self.assertEqual(takers, 3)
+        summary = [(row[1], row[5:10]) for row in sheets["Summary"]]
+        self.assertEqual(
+            summary,
+            [
+                ("absent@example.com", (0, 0, 0, 0, "Missed")),
+                ("candidate@example.com", (2, 1, 1, 6, "Failed")),
+                ("other@example.com", (0, 0, 0, 0, "Failed")),
+            ],
+        )
+
+    def test_unanswered_questions_are_blank_rows(self):
+        (takers, rows), sheets = self.export()
+        responses = [(row[0], row[1], row[4], row[6]) for row in sheets["Responses"]]
+        self.assertEqual(rows, 6)
+        self.assertEqual(
+            responses,
+            [
+                ("candidate@example.com", 1, "A", 1),
+                ("candidate@example.com", 2, None, 0),
+                ("candidate@example.com", 3, "B", 0),
+                ("other@example.com", 1, None, 0),
+                ("other@example.com", 2, None, 0),
+                ("other@example.com", 3, None, 0),
+            ],
+        )
+
+    def test_export_time_and_memory_are_recorded(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("admin:quiz_export", args=[self.quiz.pk]))
+        self.assertEqual(response.status_code, 200)
+        b"".join(response.streaming_content)
+        export = QuizExport.objects.get()
+        self.assertEqual((export.takers, export.responses), (3, 6))
+        self.assertEqual(export.exported_by, self.staff)
+        if export.peak_rss is not None:
+            self.assertGreaterEqual(export.peak_rss, export.rss_before)
+        changelist = self.client.get(reverse("admin:quiz_app_quizexport_changelist"))
+        self.assertContains(changelist, "MB")
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "quiz_app.cache.TieredCache",
+            "OPTIONS": {"SHARED": "tiered_test_shared", "LOCAL_TIMEOUT": 5},
+        },
+        "tiered_test_shared": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "tiered_test_shared",
+        },
+    }
+)
+class TieredCacheTests(TestCase):
+    """The per process cache in front of the shared cache"""
+
+    def setUp(self):
+        tiered_cache._processes.pop("tiered_test_shared", None)
+        self.cache = _create_cache("default")
+        self.shared = caches["tiered_test_shared"]
+        self.shared.clear()
+        self.now = 1000.0
+        monotonic = patch("quiz_app.cache.time.monotonic", lambda: self.now)
+        monotonic.start()
+        self.addCleanup(monotonic.stop)
+
+    def test_local_hit(self):
+        self.cache.set("key", [1])
+        self.shared.set("key", [2])
+        self.assertEqual(self.cache.get("key"), [1])
+        stats = self.cache.stats()
+        self.assertEqual(stats["local"], {"hits": 1, "misses": 0, "entries": 1})
+        self.assertEqual(stats["shared"], {"hits": 0, "misses": 0})
+
+    def test_expired_local_copy_falls_back_to_shared(self):
+        self.cache.set("key", [1])
+        self.shared.set("key", [2])
+        self.now += 6
+        self.assertEqual(self.cache.get("key"), [2])
+        self.assertEqual(self.cache.get("key"), [2])
+        self.assertIsNone(self.cache.get("missing"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["local"]["hits"], stats["local"]["misses"]), (1, 2))
+        self.assertEqual(stats["shared"], {"hits": 1, "misses": 1})
+
+    def test_delete_and_incr_drop_the_local_copy(self):
+        self.cache.set("count", 1)
+        self.assertEqual(self.cache.incr("count"), 2)
+        self.assertEqual(self.cache.get("count"), 2)
+        self.cache.set("key", [1])
+        self.cache.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+        self.assertIsNone(self.shared.get("key"))
+
+    def test_threads_share_the_local_tier(self):
+        self.cache.set("key", [1])
+        other = _create_cache("default")
+        self.shared.delete("key")
+        self.assertEqual(other.get("key"), [1])
+        self.assertEqual(other.stats(), self.cache.stats())
+
+    def test_counters_are_in_the_metrics(self):
+        self.cache.set("key", [1])
+        self.cache.get("key")
+        with patch("quiz_app.cache.caches", {"default": self.cache}):
+            snapshot = metrics.Registry().snapshot()
+        self.assertIn(
+            ["quiz_cache_requests_total", ["default", "local", "hits"], 1],
+            snapshot["counters"],
+        )
+
+
+class QuizEntryTests(QuizTestCase):
+    """One-time entry links"""
+
+    def setUp(self):
+        self.client = Client()
+        Account.objects.filter(pk=self.user.pk).update(is_active=True)
+        tokens = dict(entry.issue_tokens(self.quiz))
+        self.token = next(
+            token for quizTaker, token in tokens.items() if quizTaker.user == self.user
+        )
+        self.url = reverse("quiz_entry", args=[self.token])
+
+    def test_get_only_asks_to_confirm(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'method="POST"')
+        self.client.get(self.url)
+        self.assertNotIn("_auth_user_id", self.client.session)
+        self.assertTrue(QuizTakers.objects.get(pk=self.quizTaker.pk).entry_nonce)
+
+    def test_post_logs_in_once(self):
+        response = self.client.post(self.url)
+        self.assertRedirects(
+            response,
+            reverse("quiz_started", args=[self.quiz.pk]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(int(self.client.session["_auth_user_id"]), self.user.pk)
+
+        other = Client()
+        self.assertRedirects(
+            other.post(self.url), reverse("home"), fetch_redirect_response=False
+        )
+        self.assertRedirects(
+            other.get(self.url), reverse("home"), fetch_redirect_response=False
+        )
+        self.assertNotIn("_auth_user_id", other.session)
+
+    def test_unused_links_stay_valid(self):
+        tokens = dict(entry.issue_tokens(self.quiz))
+        self.assertIn(self.token, tokens.values())
+
+    def test_tampered_token_is_rejected(self):
+        self.assertIsNone(entry.check_token(self.token + "x"))
+        self.assertIsNone(entry.use_token(self.token[:-1]))
+
+
+class EmailLoginTests(TestCase):
+    """The emails are stored lowercased and looked up exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user("Mixed.Case@Example.com", "User", "pw")
+
+    def test_email_is_stored_lowercased(self):
+        self.assertEqual(self.user.email, "mixed.case@example.com")
+
+    def test_login_whatever_the_case_with_one_lookup(self):
+        with self.assertNumQueries(1):
+            user = authenticate(None, email=" MIXED.case@example.COM ", password="pw")
+        self.assertEqual(user, self.user)
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(None, email="nobody@x.com", password="pw"))
+
+    def test_inactive_users_are_authenticated(self):
+        # to be asked to verify their email
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(
+            authenticate(None, email="mixed.case@example.com", password="pw"),
+            self.user,
+        )
+
+    def test_signup_rejects_an_email_differing_by_case(self):
+        form = SignUpForm(
+            {
+                "full_name": "Other",
+                "email": "MIXED.CASE@example.com",
+                "password1": "Xx12345678!a",
+                "password2": "Xx12345678!a",
+                "timeZone": "UTC",
+            }
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("email", form.errors)
+
+
+class NormalizeEmailsMigrationTests(TestCase):
+    """The migration lowercasing the stored emails"""
+
+    normalize_emails = staticmethod(
+        import_module(
+            "quiz_app.migrations.0030_normalize_account_emails"
+        ).normalize_emails
+    )
+
+    def test_emails_are_lowercased(self):
+        user = Account.objects.create_user("user@example.com", "User")
+        Account.objects.filter(pk=user.pk).update(email="User@Example.com")
+        self.normalize_emails(apps, None)
+        user.refresh_from_db()
+        self.assertEqual(user.email, "user@example.com")
+
+    def test_emails_differing_by_case_fail_the_migration(self):
+        first = Account.objects.create_user("user@example.com", "User")
+        second = Account.objects.create_user("other@example.com", "Other")
+        Account.objects.filter(pk=second.pk).update(email="USER@example.com")
+        with self.assertRaisesMessage(RuntimeError, f"{first.pk} <user@example.com>"):
+            self.normalize_emails(apps, None)
+        second.refresh_from_db()
+        self.assertEqual(second.email, "USER@example.com")
+
+
+class QuestionBankImportTests(TestCase):
+    """Importing an uploaded workbook into the question bank"""
+
+    HEADER = ["Question Statement", "Option 1", "Option 2", "Correct Answer-1"]
+    HEADER += ["Marks", "Tag", "Level"]
+
+    def workbook(self, rows) -> bytes:
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(self.HEADER)
+        for row in rows:
+            sheet.append(row)
+        output = BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    def run_import(self, rows):
+        bankImport = QuestionBankImport.objects.create(
+            filename="bank.xlsx", file=self.workbook(rows)
+        )
+        question_import.run(bankImport.pk)
+        return QuestionBankImport.objects.get(pk=bankImport.pk)
+
+    def test_rows_are_imported_once(self):
+        rows = [
+            ["What is 1 + 1?", "2", "3", "2", 2, "C", "easy"],
+            ["What is 2 + 2?", "4", "5", "4", None, "ds", "advanced"],
+            ["What is 1 + 1?", "2", "3", "2", 2, "C", "easy"],
+            ["No choices", None, None, "2", 1, "C", "easy"],
+            ["Bad tag", "1", "2", "1", 1, "rust", "easy"],
+        ]
+        bankImport = self.run_import(rows)
+        self.assertEqual(bankImport.status, QuestionBankImport.DONE)
+        self.assertEqual(
+            (
+                bankImport.created_count,
+                bankImport.duplicate_count,
+                bankImport.error_count,
+            ),
+            (2, 1, 2),
+        )
+        self.assertIn("Row 5: missing choice_1, choice_2", bankImport.errors)
+        self.assertEqual(bytes(bankImport.file), b"")
+        question = Question_bank.objects.get(title="What is 2 + 2?")
+        self.assertEqual((question.marks, question.level), (1, "advanced"))
+
+        again = self.run_import(rows[:2])
+        self.assertEqual((again.created_count, again.duplicate_count), (0, 2))
+        self.assertEqual(Question_bank.objects.count(), 2)
+
+    def test_missing_columns_fail_the_import(self):
+        self.HEADER = ["Question Statement", "Option 1"]
+        bankImport = self.run_import([["What?", "1"]])
+        self.assertEqual(bankImport.status, QuestionBankImport.FAILED)
+        self.assertIn("Missing columns", bankImport.errors)
+
+    def test_invalid_workbook_fails_the_import(self):
+        bankImport = QuestionBankImport.objects.create(
+            filename="bank.xlsx", file=b"not a workbook"
+        )
+        question_import.run(bankImport.pk)
+        bankImport.refresh_from_db()
+        self.assertEqual(bankImport.status, QuestionBankImport.FAILED)
+
+    def test_duplicate_question_is_rejected_by_clean(self):
+        question = Question_bank(
+            title="Q", choice_1="A", choice_2="B", correct="A", tag="C"
+        )
+        question.save()
+        duplicate = Question_bank(
+            title=" Q ", choice_1="A", choice_2="B", correct="B", tag="os"
+        )
+        with self.assertRaises(ValidationError):
+            duplicate.clean()
+        question.clean()
+
+
+@skipUnless(metrics.fcntl, "the processes are only checked on Unix")
+class MetricsArchiveTests(TestCase):
+    """The metrics files of the processes that exited"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(METRICS={"DIR": self.directory})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write_exited(self, value):
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        filename = f"{process.pid}-1.json"
+        metrics.write(
+            os.path.join(self.directory, filename),
+            {
+                "counters": [["quiz_db_queries_total", ["home"], value]],
+                "histograms": [],
+            },
+        )
+        return filename
+
+    def test_exited_processes_are_archived(self):
+        registry = metrics.Registry()
+        registry.inc("quiz_db_queries_total", ("home",), 1)
+        registry.flush(force=True)
+        dead = self.write_exited(2)
+
+        counters, _ = metrics.collect()
+        self.assertEqual(counters["quiz_db_queries_total", ("home",)], 3)
+        files = os.listdir(self.directory)
+        self.assertNotIn(dead, files)
+        self.assertIn(metrics.ARCHIVE, files)
+        self.assertIn(registry.filename, files)
+
+        self.write_exited(4)
+        counters, _ = metrics.collect()
+        self.assertEqual(counters["quiz_db_queries_total", ("home",)], 7)
+        with open(os.path.join(self.directory, metrics.ARCHIVE)) as f:
+            self.assertEqual(
+                json.load(f)["counters"], [["quiz_db_queries_total", ["home"], 6]]
+            )
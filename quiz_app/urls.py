@@ -1,10 +1,11 @@
 from django.urls import path
 
-from quiz_app import ajax, views
+from quiz_app import ajax, metrics, views
 from quiz_app.staff_admin import staff_admin_site
 
 urlpatterns = [
     path("", views.home, name="home"),
+    path("entry/<token>/", views.quiz_entry, name="quiz_entry"),
     path("quiz/<quiz_id>", views.quiz, name="quiz"),
     path("quiz/result/<quiz_id>/", views.quiz_result, name="quiz_result"),
     path("quiz/export/<quiz_id>/", ajax.export_result, name="export_result"),
@@ -14,6 +15,7 @@ urlpatterns = [
     path("quiz/inst/<quiz_id>", views.quiz_instructions, name="quiz_instructions"),
     path("quiz/inst/save_extra/", ajax.save_extra, name="save_extra"),
     path("quiz/response/save/", ajax.saveResponse, name="save_response"),
+    path("quiz/response/save/batch/", ajax.saveResponses, name="save_responses"),
     path("quiz/completed/", ajax.completed, name="completed"),
     path("quiz/", views.quiz_view, name="quiz_view"),
     path("increase_suspicious/", ajax.increase_suspicious, name="increase_suspicious"),
@@ -23,6 +25,7 @@ urlpatterns = [
         name="send_verification_email",
     ),
     path("signup/", views.signup, name="signup"),
+    path("metrics/", metrics.metrics, name="metrics"),
     path("profile/", views.profile, name="profile"),
     path("staff/", staff_admin_site.home),
     path("staff/quiz_app/", staff_admin_site.home),
@@ -3,19 +3,21 @@ import random
 from json import JSONEncoder
 from uuid import UUID
 
-import pytz
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.forms.models import model_to_dict
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
-from django.utils.timezone import datetime
 from django.views.decorators.cache import cache_control
 from verify_email.email_handler import send_verification_email
 
+from . import answer_key, entry, payload, quiz_keys, suspicion
 from .forms import QuizForm, SignUpForm
-from .models import Quiz, QuizTakers, Response
+from .models import Quiz, QuizTakers
+
+PROFILE_PAGE_SIZE = 20
 
 # For setting the UUID field to string
 # To pass that field to json object
@@ -60,27 +62,53 @@ def home(request):
                 login(request, user)
                 messages.success(request, "Successfully Logged In")
         if key:
-            try:
-                quiz = Quiz.objects.filter(key=key).first()
-                if quiz:
-                    if not quiz.has_started:
-                        return redirect("quiz_upcoming", quiz_id=quiz.pk)
-                    elif not quiz.has_ended:
-                        return redirect("quiz_started", quiz_id=quiz.pk)
-                    else:
-                        return redirect("quiz_ended", quiz_id=quiz.pk)
-
+            quiz = quiz_keys.resolve(key)
+            if quiz:
+                quiz_id, start_date, end_date = quiz
+                now = timezone.now()
+                if start_date >= now:
+                    return redirect("quiz_upcoming", quiz_id=quiz_id)
+                elif end_date >= now:
+                    return redirect("quiz_started", quiz_id=quiz_id)
                 else:
-                    messages.error(request, "No Quiz Found For Given ID")
-                    return redirect("home")
+                    return redirect("quiz_ended", quiz_id=quiz_id)
 
-            except ValueError:
-                messages.error(request, "Invalid Id")
+            else:
+                messages.error(request, "No Quiz Found For Given ID")
                 return redirect("home")
 
     return render(request, "quiz_app/home.html", context)
 
 
+def quiz_entry(request, token):
+    """Log a candidate in with a one-time entry link of a quiz
+
+    No password is hashed, the link is checked by its signature and the
+    nonce of the quiz taker. A GET only asks to confirm, so that the link
+    scanners of mail providers opening it don't use it up; the link is used
+    by the POST of the confirmation.
+    """
+
+    if request.method != "POST":
+        quizTaker = entry.check_token(token)
+        if not quizTaker or not quizTaker.user.is_active:
+            messages.error(request, "This Link Is Invalid, Expired Or Already Used")
+            return redirect("home")
+        return render(request, "quiz_app/quiz_entry.html", {"quiz": quizTaker.quiz})
+
+    quizTaker = entry.use_token(token)
+    if not quizTaker or not quizTaker.user.is_active:
+        messages.error(request, "This Link Is Invalid, Expired Or Already Used")
+        return redirect("home")
+    login(
+        request, quizTaker.user, backend="quiz_app.backends.CaseInsensitiveModelBackend"
+    )
+    messages.success(request, "Successfully Logged In")
+    if quizTaker.quiz.start_date >= timezone.now():
+        return redirect("quiz_upcoming", quiz_id=quizTaker.quiz_id)
+    return redirect("quiz_started", quiz_id=quizTaker.quiz_id)
+
+
 context = {}
 
 
@@ -111,43 +139,68 @@ def quiz(request, quiz_id):
     responses = []
     if quizTaker.extra:
         if quizTaker.started:
-            quizTaker.suspicion_count += 1
-            quizTaker.save()
+            suspicion.increase(quiz_id, request.user.pk)
             messages.warning(
                 request,
                 "Do not move away from the test or it will be marked suspicious.",
             )
-
+        else:
+            quizTaker.started = timezone.now()
+            quizTaker.shuffle_seed = random.getrandbits(31)
+            quizTaker.total_marks = sum(
+                marks for _, marks in answer_key.get_answer_key(quiz_id).values()
+            )
+            # only the first of concurrent first requests starts the attempt
+            if not QuizTakers.objects.filter(
+                pk=quizTaker.pk, started__isnull=True
+            ).update(
+                started=quizTaker.started,
+                shuffle_seed=quizTaker.shuffle_seed,
+                total_marks=quizTaker.total_marks,
+            ):
+                quizTaker.refresh_from_db()
+
+        if quizTaker.shuffle_seed is None:
+            # attempts started before the shuffle seed was stored have a
+            # response row for every question in the order shown
             queryset = (
                 quizTaker.response_set.select_related("question").all().order_by("pk")
             )
-            # fetching questions 
             for response in queryset:
                 questions.append(model_to_dict(response.question, exclude=["correct"]))
                 responses.append(
                     model_to_dict(response, exclude=["id", "isCorrect", "marks"])
                 )
+            questions = json.dumps(questions)
         else:
-            quizTaker.started = timezone.now()
-            quizTaker.save()
-            shuffledQuestions = quiz.question_set.all()[::1]
-            random.shuffle(shuffledQuestions)
-
-            responseList = []
-            for question in shuffledQuestions:
-                response = Response(quiztaker=quizTaker, question=question, answer="")
-                responseList.append(response)
-                questions.append(model_to_dict(question, exclude=["correct"]))
+            # response rows are only created once a question is answered,
+            # the questions are sent as the cached JSON in the attempt's order
+            questionJson = payload.get_payload(quiz_id)
+            order = quizTaker.question_order(questionJson.keys())
+            questions = payload.join(questionJson, order)
+            rows = quizTaker.response_set.order_by().values_list(
+                "question_id", "answer", "sequence"
+            )
+            answered = {
+                question_id: (answer, sequence)
+                for question_id, answer, sequence in rows
+            }
+            for question_id in order:
+                answer, sequence = answered.get(question_id, ("", 0))
                 responses.append(
-                    model_to_dict(response, exclude=["id", "isCorrect", "marks"])
+                    {
+                        "quiztaker": quizTaker.pk,
+                        "question": question_id,
+                        "answer": answer,
+                        "sequence": sequence,
+                    }
                 )
-            Response.objects.bulk_create(responseList, ignore_conflicts=True)
     else:
         return redirect("quiz_instructions", quiz_id=quiz_id)
     shuffle = quiz.isShuffle
     context = {
         "quiz": quiz,
-        "questions": json.dumps(questions),
+        "questions": questions,
         "responses": json.dumps(responses),
         "shuffle": json.dumps(shuffle),
         "quizTaker": quizTaker,
@@ -177,13 +230,9 @@ def quiz_result(request, quiz_id):
         return redirect("quiz_ended", quiz_id=quiz_id)
     if quiz.has_started and not quizTaker.has_ended:
         return redirect("quiz", quiz_id=quiz_id)
-    queryset = (
-        quizTaker.response_set.select_related("question").all().order_by("question_id")
-    )
-
     context = {
         "quiz": quiz,
-        "responses": queryset,
+        "responses": quizTaker.responses_with_unanswered(),
         "quizTaker": quizTaker,
     }
 
@@ -250,7 +299,7 @@ def quiz_instructions(request, quiz_id):
         return redirect("quiz_upcoming", quiz_id=quiz_id)
     if quiz.has_ended and not quizTaker.started:
         return redirect("quiz_ended", quiz_id=quiz_id)
-    if quizTaker.completed:
+    if quizTaker.has_ended:
         return redirect("quiz_result", quiz_id=quiz_id)
     if quizTaker.started:
         return redirect("quiz", quiz_id=quiz_id)
@@ -280,29 +329,31 @@ def signup(request):
 def profile(request):
     if request.user.is_staff:
         return redirect("staff_admin:index")
-    quizTakers = QuizTakers.objects.filter(user=request.user).all()
-    past = []
+    quizTakers = (
+        QuizTakers.objects.filter(user=request.user)
+        .select_related("quiz")
+        .with_state()
+    )
+    # current and upcoming are sorted by the distance of the start from now
     current = []
     upcoming = []
-    for quizTaker in quizTakers:
-        if quizTaker.was_missed:
-            past.append(quizTaker)
-            continue
-        if quizTaker.has_ended:
-            past.append(quizTaker)
-            continue
-        if not quizTaker.quiz.has_started:
+    for quizTaker in quizTakers.filter(
+        state__in=[QuizTakers.CURRENT, QuizTakers.UPCOMING]
+    ).order_by("quiz__start_date"):
+        if quizTaker.state == QuizTakers.UPCOMING:
             upcoming.append(quizTaker)
-            continue
-        current.append(quizTaker)
-    curDateTime = datetime.utcnow().replace(tzinfo=pytz.UTC)
-    past.sort(key=lambda q: abs(curDateTime - q.quiz.start_date))
-    current.sort(key=lambda q: abs(curDateTime - q.quiz.start_date))
-    upcoming.sort(key=lambda q: abs(curDateTime - q.quiz.start_date))
+        else:
+            current.append(quizTaker)
+    current.reverse()
+    past = Paginator(
+        quizTakers.filter(
+            state__in=[QuizTakers.ENDED, QuizTakers.MISSED]
+        ).order_by("-quiz__start_date"),
+        PROFILE_PAGE_SIZE,
+    ).get_page(request.GET.get("page"))
     context = {
         "past": past,
         "current": current,
         "upcoming": upcoming,
     }
     return render(request, "registration/profile.html", context)
-
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 import os
 from pathlib import Path
 
+import dj_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -30,13 +32,59 @@ DEBUG = True
 ALLOWED_HOSTS = ["*"]
 # ALLOWED_HOSTS = ["quiz-web-app0.herokuapp.com", "127.0.0.1", "192.168.1.3", "localhost"]
 
-# Disable caching
+# Two tier cache, a per process LRU in front of the shared cache
+# The shared cache can be switched to memcached with CACHE_BACKEND and
+# CACHE_LOCATION, LOCAL_TIMEOUT bounds how long a change made through another
+# process can go unseen
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": "/var/tmp/django_cache",
-        "TIMEOUT": 1,
-    }
+        "BACKEND": "quiz_app.cache.TieredCache",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "SHARED": "shared",
+            "MAX_ENTRIES": 1000,
+            "LOCAL_TIMEOUT": 5,
+        },
+    },
+    "shared": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "/var/tmp/django_cache"),
+        "TIMEOUT": 300,
+    },
+}
+
+# Background job queue, the workers are started with `python manage.py runjobs`
+# BACKOFF is the delay in seconds before the first retry, doubled on every retry
+JOB_QUEUE = {
+    "CONCURRENCY": int(os.environ.get("JOB_CONCURRENCY", 2)),
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF": 30,
+    "POLL_INTERVAL": 1,
+    "LOCK_TIMEOUT": 600,
+}
+
+# Per process LRU cache of the answer keys used for grading, reloaded once the
+# content version of the quiz in the shared cache changes, and after TIMEOUT
+ANSWER_KEY_CACHE = {
+    "MAX_QUIZZES": 64,
+    "TIMEOUT": 300,
+}
+
+# One-time entry links of the quiz takers, downloaded from the quiz admin,
+# valid for MAX_AGE seconds and until the end of their quiz
+ENTRY_TOKENS = {
+    "MAX_AGE": 7 * 24 * 60 * 60,
+}
+
+# Request metrics served in the Prometheus text format at /metrics/
+# Every worker process writes its metrics to a file in DIR, TOKEN is the bearer
+# token of the scraper, without it the metrics are only shown to staff users
+METRICS = {
+    "DIR": os.environ.get("METRICS_DIR", "/var/tmp/quiz_metrics"),
+    "FLUSH_INTERVAL": 1,
+    "TOKEN": os.environ.get("METRICS_TOKEN"),
 }
 
 # Application definition
@@ -55,6 +103,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "quiz_app.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,7 +118,8 @@ ROOT_URLCONF = "quiz_project.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # the django backend, timing the rendering for the metrics
+        "BACKEND": "quiz_app.metrics.DjangoTemplates",
         "DIRS": [str(BASE_DIR.joinpath("templates"))],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -84,10 +134,7 @@ TEMPLATES = [
 ]
 
 AUTH_USER_MODEL = "quiz_app.Account"
-AUTHENTICATION_BACKENDS = (
-    "django.contrib.auth.backends.AllowAllUsersModelBackend",
-    "quiz_app.backends.CaseInsensitiveModelBackend",
-)
+AUTHENTICATION_BACKENDS = ("quiz_app.backends.CaseInsensitiveModelBackend",)
 
 WSGI_APPLICATION = "quiz_project.wsgi.application"
 
@@ -107,6 +154,10 @@ DATABASES = {
     }
 }
 
+# Another database, e.g. sqlite:///db.sqlite3 or a local MySQL for load tests
+if os.environ.get("DATABASE_URL"):
+    DATABASES["default"] = dj_database_url.config()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -149,12 +200,28 @@ LOGOUT_REDIRECT_URL = "home"
 
 
 # reset password
-# For development purposes Django lets us store emails either in the console or as a file.
-# EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
-# EMAIL_FILE_PATH = str(BASE_DIR.joinpath("sent_emails"))
 # DataFlair
 HTML_MESSAGE_TEMPLATE = "email/email_verification.html"
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# The mails are stored in the outbox and delivered by `python manage.py sendmail`
+# through MAIL_OUTBOX BACKEND, one connection per batch of BATCH_SIZE mails and
+# at most RATE mails per second. BACKOFF is the delay in seconds before the
+# first retry, doubled on every retry, the mails still failing after
+# MAX_ATTEMPTS are kept as dead.
+# For development purposes the mails can be written to files instead:
+# MAIL_OUTBOX_BACKEND=django.core.mail.backends.filebased.EmailBackend
+EMAIL_BACKEND = "quiz_app.mail.OutboxBackend"
+MAIL_OUTBOX = {
+    "BACKEND": os.environ.get(
+        "MAIL_OUTBOX_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+    ),
+    "BATCH_SIZE": 50,
+    "RATE": 10,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF": 30,
+    "POLL_INTERVAL": 1,
+    "LOCK_TIMEOUT": 600,
+}
+EMAIL_FILE_PATH = str(BASE_DIR.joinpath("sent_emails"))
 EMAIL_HOST = "smtp.mailtrap.io"
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = "5468349e54d342"